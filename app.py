@@ -1,22 +1,49 @@
 from __future__ import annotations
 
+import math
 import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
 from decimal import Decimal, InvalidOperation
-from datetime import date
+from datetime import date, timedelta
 from functools import wraps
 
+import click
+import MySQLdb.cursors
 from flask import (
     Flask, render_template, request, redirect, url_for,
-    flash, session, abort
+    flash, session, abort, jsonify, stream_template, get_flashed_messages, g
 )
 from flask_mysqldb import MySQL
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzip-only
+    brotli = None
+
 
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret-change-me")
 
+# Compiled templates are cached on disk (keyed by source checksum, so edits are picked up).
+# Must be set before app.jinja_env is first touched.
+JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR", os.path.join(app.instance_path, "jinja_cache"))
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(JINJA_CACHE_DIR)}
+# Optional: drop the newline/indentation around {% %} tags to shrink rendered HTML.
+if os.environ.get("HTML_TRIM_BLOCKS", "0") == "1":
+    app.jinja_options = {**app.jinja_options, "trim_blocks": True, "lstrip_blocks": True}
+
 app.config["MYSQL_HOST"] = os.environ.get("MYSQL_HOST", "localhost")
 app.config["MYSQL_USER"] = os.environ.get("MYSQL_USER", "root")
 app.config["MYSQL_PASSWORD"] = os.environ.get("MYSQL_PASSWORD", "root")
@@ -33,11 +60,67 @@ if ssl_ca:
 
 mysql = MySQL(app)
 
+# Read replicas ("host[:port],host[:port]"), same credentials as the primary. Routes marked
+# @replica_reads send their fetch_one/fetch_all there; writes and locking reads stay on the primary.
+REPLICA_HOSTS = [
+    (host, int(port or app.config["MYSQL_PORT"]))
+    for host, _, port in (h.strip().partition(":") for h in os.environ.get("MYSQL_REPLICA_HOSTS", "").split(","))
+    if host
+]
+# After a write, the same session reads from the primary for this long (read-your-writes).
+app.config["REPLICA_STICKY_SECONDS"] = int(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+
 UPLOAD_FOLDER = os.path.join("static", "uploads")
 os.makedirs(os.path.join(app.root_path, UPLOAD_FOLDER), exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 5 * 1024 * 1024
 
+# Pending invoices hold their stock reservation this long before the sweeper releases it.
+app.config["RESERVATION_TTL_MINUTES"] = int(os.environ.get("RESERVATION_TTL_MINUTES", "2880"))
+app.config["RESERVATION_SWEEP_BATCH"] = int(os.environ.get("RESERVATION_SWEEP_BATCH", "500"))
+# Seconds between background sweeps; 0 disables the thread (use `flask sweep-reservations`).
+app.config["RESERVATION_SWEEP_INTERVAL"] = int(os.environ.get("RESERVATION_SWEEP_INTERVAL", "0"))
+
+# Checkout idempotency tokens are kept this long, then purged by the sweeper.
+app.config["CHECKOUT_TOKEN_TTL_HOURS"] = int(os.environ.get("CHECKOUT_TOKEN_TTL_HOURS", "24"))
+
+# Storefront facet index: full rebuild at least this often (other workers' writes show up by then).
+app.config["FACET_TTL_SECONDS"] = int(os.environ.get("FACET_TTL_SECONDS", "300"))
+
+# Add-to-cart validates against an in-process availability snapshot this old at most.
+app.config["AVAILABILITY_TTL_SECONDS"] = int(os.environ.get("AVAILABILITY_TTL_SECONDS", "30"))
+
+# Supplier/place/position lookups for admin forms; also bounds staleness across worker processes.
+app.config["REFERENCE_CACHE_TTL_SECONDS"] = int(os.environ.get("REFERENCE_CACHE_TTL_SECONDS", "600"))
+
+# Replenishment defaults (days): sales window for velocity, supplier lead time, stock to cover after arrival.
+app.config["REPLENISH_WINDOW_DAYS"] = int(os.environ.get("REPLENISH_WINDOW_DAYS", "28"))
+app.config["REPLENISH_LEAD_DAYS"] = int(os.environ.get("REPLENISH_LEAD_DAYS", "7"))
+app.config["REPLENISH_COVER_DAYS"] = int(os.environ.get("REPLENISH_COVER_DAYS", "21"))
+
+# Archival: Completed invoices older than this move to InvoiceArchive/OrdersArchive.
+app.config["ARCHIVE_AFTER_DAYS"] = int(os.environ.get("ARCHIVE_AFTER_DAYS", "365"))
+app.config["ARCHIVE_BATCH"] = int(os.environ.get("ARCHIVE_BATCH", "500"))
+
+# Rate limiting: "memory" keeps buckets per process; "sqlite" shares them between workers on one host.
+app.config["RATE_LIMIT_BACKEND"] = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+app.config["RATE_LIMIT_SQLITE_PATH"] = os.environ.get(
+    "RATE_LIMIT_SQLITE_PATH", os.path.join(app.instance_path, "ratelimit.sqlite3"))
+# Behind a reverse proxy, set to the number of proxies in front of the app so remote_addr (the
+# anonymous rate-limit key) comes from X-Forwarded-For instead of being the proxy's address.
+app.config["PROXY_FIX_HOPS"] = int(os.environ.get("PROXY_FIX_HOPS", "0"))
+if app.config["PROXY_FIX_HOPS"] > 0:
+    hops = app.config["PROXY_FIX_HOPS"]
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+# Load shedding: checkouts in flight per worker process before new ones get 503.
+app.config["CHECKOUT_MAX_INFLIGHT"] = int(os.environ.get("CHECKOUT_MAX_INFLIGHT", "8"))
+app.config["CHECKOUT_RETRY_AFTER"] = int(os.environ.get("CHECKOUT_RETRY_AFTER", "5"))
+
+# Response compression: bodies below COMPRESS_MIN_SIZE bytes are sent as-is (streamed ones always compress).
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", "1024"))
+app.config["COMPRESS_LEVEL"] = int(os.environ.get("COMPRESS_LEVEL", "6"))
+app.config["COMPRESS_BR_QUALITY"] = int(os.environ.get("COMPRESS_BR_QUALITY", "5"))
+
 
 
 def money(value) -> Decimal:
@@ -84,15 +167,83 @@ def role_required(*roles):
     return deco
 
 
-def fetch_one(query: str, params: tuple = ()):
-    cur = mysql.connection.cursor()
+def replica_reads(fn):
+    """Route this view's plain reads to a replica, unless the session wrote recently."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.use_replica = (
+            bool(REPLICA_HOSTS)
+            and request.method in ("GET", "HEAD")
+            and time.time() >= session.get("primary_until", 0)
+        )
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def replica_connection():
+    """This app context's replica connection, or None when reads should use the primary."""
+    if not g.get("use_replica"):
+        return None
+    conn = g.get("replica_conn")
+    if conn is None:
+        host, port = random.choice(REPLICA_HOSTS)
+        try:
+            conn = MySQLdb.connect(
+                host=host, port=port,
+                user=app.config["MYSQL_USER"], passwd=app.config["MYSQL_PASSWORD"],
+                db=app.config["MYSQL_DB"], cursorclass=MySQLdb.cursors.DictCursor,
+                connect_timeout=2, **app.config.get("MYSQL_CUSTOM_OPTIONS", {}),
+            )
+        except MySQLdb.Error as e:
+            app.logger.warning("Replica %s:%s unavailable, reading from primary: %s", host, port, e)
+            record_metric("replica.fallback")
+            g.use_replica = False
+            return None
+        g.replica_conn = conn
+    return conn
+
+
+def read_connection(query: str):
+    if "FOR UPDATE" in query.upper():
+        return mysql.connection
+    conn = replica_connection()
+    record_metric("db.reads.replica" if conn else "db.reads.primary")
+    return conn or mysql.connection
+
+
+@app.teardown_appcontext
+def close_replica(_exc):
+    conn = g.pop("replica_conn", None)
+    if conn is not None:
+        conn.close()
+
+
+@app.after_request
+def stick_to_primary(response):
+    if REPLICA_HOSTS and request.method not in ("GET", "HEAD", "OPTIONS"):
+        session["primary_until"] = time.time() + app.config["REPLICA_STICKY_SECONDS"]
+    return response
+
+
+def fetch_one(query: str, params: tuple | dict = ()):
+    cur = read_connection(query).cursor()
     cur.execute(query, params)
     row = cur.fetchone()
     cur.close()
     return row
 
 
-def fetch_all(query: str, params: tuple = ()):
+def fetch_all(query: str, params: tuple | dict = ()):
+    cur = read_connection(query).cursor()
+    cur.execute(query, params)
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+def fetch_all_primary(query: str, params: tuple | dict = ()):
+    """fetch_all on the primary even under @replica_reads, for filling process-wide caches."""
+    record_metric("db.reads.primary")
     cur = mysql.connection.cursor()
     cur.execute(query, params)
     rows = cur.fetchall()
@@ -100,6 +251,53 @@ def fetch_all(query: str, params: tuple = ()):
     return rows
 
 
+STREAM_FETCH_ROWS = 200
+STREAM_CHUNK_BYTES = 8192
+
+
+def stream_rows(query: str, params: tuple = ()):
+    """Yield rows from an unbuffered server-side cursor, STREAM_FETCH_ROWS at a time.
+
+    No other query may run on the connection until the generator is exhausted.
+    """
+    cur = read_connection(query).cursor(MySQLdb.cursors.SSDictCursor)
+    try:
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(STREAM_FETCH_ROWS)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cur.close()
+
+
+def stream_listing(template: str, **context):
+    """Render template as a streamed response, sent in STREAM_CHUNK_BYTES pieces.
+
+    Flashes are popped now because the session cookie goes out before the body.
+    """
+    get_flashed_messages(with_categories=True)
+    parts = stream_template(template, **context)
+
+    def coalesce():
+        buf, size = [], 0
+        try:
+            for part in parts:
+                buf.append(part)
+                size += len(part)
+                if size >= STREAM_CHUNK_BYTES:
+                    yield "".join(buf)
+                    buf, size = [], 0
+            if buf:
+                yield "".join(buf)
+        finally:
+            if hasattr(parts, "close"):
+                parts.close()
+
+    return app.response_class(coalesce(), mimetype="text/html")
+
+
 def execute(query: str, params: tuple = ()) -> int:
     cur = mysql.connection.cursor()
     cur.execute(query, params)
@@ -108,12 +306,672 @@ def execute(query: str, params: tuple = ()) -> int:
     return last_id
 
 
+def after_commit(fn) -> None:
+    """Run fn once the current transaction commits through commit(); dropped on rollback()."""
+    g.setdefault("after_commit", []).append(fn)
+
+
+def commit() -> None:
+    """Commit, then run the after_commit() callbacks (cache invalidations) queued by it."""
+    mysql.connection.commit()
+    for fn in g.pop("after_commit", ()):
+        fn()
+
+
+def rollback() -> None:
+    mysql.connection.rollback()
+    g.pop("after_commit", None)
+
+
+class QueryShape:
+    """One canonical statement for a filtered listing.
+
+    Optional filters are always present as `(%(x)s IS NULL OR ...)` and bound by
+    name, so every filter combination sends the same text. Only ORDER BY varies,
+    from a fixed list. Statements per route are therefore bounded, digest stats
+    in performance_schema line up with the per-shape timings recorded here, and
+    MySQL folds the NULL checks away when it plans each query.
+    mysqlclient has no server-side prepared statements (it interpolates client-
+    side) and connections live for one request, so statements go out as text.
+    """
+
+    def __init__(self, name: str, sql: str, orders: dict[str, str], default_order: str):
+        self.name = name
+        self.sql = sql
+        self.orders = orders
+        self.default_order = default_order
+
+    def fetch_all(self, params: dict, order: str | None = None,
+                  limit: int | None = None, offset: int = 0):
+        if order not in self.orders:
+            order = self.default_order
+        sql = f"{self.sql} ORDER BY {self.orders[order]}"
+        if limit is not None:
+            sql += " LIMIT %(limit)s OFFSET %(offset)s"
+            params = {**params, "limit": limit, "offset": offset}
+        started = time.perf_counter()
+        rows = fetch_all(sql, params)
+        record_metric(f"query.{self.name}.{order}.ms", (time.perf_counter() - started) * 1000)
+        return rows
+
+
+def sql_in(values) -> str:
+    """Placeholder list for an IN (...) clause with one %s per value."""
+    return ", ".join(["%s"] * len(values))
+
+
+_metrics_lock = threading.Lock()
+METRICS: dict[str, dict] = {}
+
+
+def record_metric(name: str, value: float = 1.0) -> None:
+    """Add one observation to an in-process counter (count / total / max)."""
+    with _metrics_lock:
+        m = METRICS.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        m["count"] += 1
+        m["total"] += value
+        m["max"] = max(m["max"], value)
+
+
+def metrics_snapshot() -> dict[str, dict]:
+    with _metrics_lock:
+        return {
+            name: {**m, "avg": (m["total"] / m["count"]) if m["count"] else 0.0}
+            for name, m in sorted(METRICS.items())
+        }
+
+
+class MemoryBucketStore:
+    """Token buckets in a dict, for one worker process.
+
+    Keys are kept in least-recently-used order. Every PRUNE_INTERVAL seconds the
+    idle ones (untouched for PRUNE_REFILLS of the longest refill period seen, so
+    already full) are dropped from the old end; past MAX_KEYS the oldest go too.
+    """
+
+    MAX_KEYS = 50_000
+    PRUNE_INTERVAL = 60.0
+    PRUNE_REFILLS = 4
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._max_refill = 0.0
+        self._next_prune = 0.0
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """Spend one token. Returns 0 when allowed, else seconds until a token is back."""
+        now = time.monotonic()
+        with self._lock:
+            self._max_refill = max(self._max_refill, capacity / rate)
+            if now >= self._next_prune:
+                self._next_prune = now + self.PRUNE_INTERVAL
+                idle_before = now - self.PRUNE_REFILLS * self._max_refill
+                while self._buckets and next(iter(self._buckets.values()))[1] < idle_before:
+                    self._buckets.popitem(last=False)
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self._buckets) > self.MAX_KEYS:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class SQLiteBucketStore:
+    """Token buckets in a local SQLite file, shared by all workers on the host.
+
+    Every PRUNE_INTERVAL seconds a take() also deletes buckets idle for PRUNE_REFILLS of
+    the longest refill period seen; by then they are full and carry no state.
+    """
+
+    PRUNE_INTERVAL = 60.0
+    PRUNE_REFILLS = 4
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._max_refill = 0.0
+        self._next_prune = 0.0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bucket (
+                    key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS bucket_updated ON bucket (updated)")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens = min(capacity, row[0] + (now - row[1]) * rate) if row else capacity
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._max_refill = max(self._max_refill, capacity / rate)
+        if now >= self._next_prune:
+            self._next_prune = now + self.PRUNE_INTERVAL
+            self.prune(now - self.PRUNE_REFILLS * self._max_refill)
+        return wait
+
+    def prune(self, before: float) -> int:
+        """Delete buckets last touched before `before` (a time.time() value)."""
+        return self._conn().execute("DELETE FROM bucket WHERE updated < ?", (before,)).rowcount
+
+
+def make_bucket_store():
+    if app.config["RATE_LIMIT_BACKEND"] == "sqlite":
+        os.makedirs(os.path.dirname(app.config["RATE_LIMIT_SQLITE_PATH"]), exist_ok=True)
+        return SQLiteBucketStore(app.config["RATE_LIMIT_SQLITE_PATH"])
+    return MemoryBucketStore()
+
+
+bucket_store = make_bucket_store()
+
+
+def rate_limit_key() -> str:
+    user_id = session.get("user_id")
+    return f"user:{user_id}" if user_id else f"ip:{request.remote_addr}"
+
+
+def rate_limited(name: str, capacity: int, per_minute: int):
+    """Allow `capacity` POSTs in a burst per client, refilled at `per_minute`; 429 beyond that."""
+    rate = per_minute / 60.0
+
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method == "POST":
+                try:
+                    wait = bucket_store.take(f"{name}:{rate_limit_key()}", capacity, rate)
+                except sqlite3.Error as e:
+                    # A busy or broken limiter store must not take the shop down.
+                    app.logger.warning("Rate limiter unavailable: %s", e)
+                    record_metric("ratelimit.errors")
+                    wait = 0.0
+                if wait:
+                    record_metric(f"ratelimit.{name}.rejected")
+                    abort(429, retry_after=math.ceil(wait))
+            return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+class LoadShedder:
+    """Counts requests in flight in this process and turns away those over the limit."""
+
+    def __init__(self, name: str, limit_key: str):
+        self.name = name
+        self.limit_key = limit_key
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method != "POST":
+                return fn(*args, **kwargs)
+            with self._lock:
+                admitted = self.inflight < app.config[self.limit_key]
+                if admitted:
+                    self.inflight += 1
+                inflight = self.inflight
+            record_metric(f"shed.{self.name}.inflight", inflight)
+            if not admitted:
+                record_metric(f"shed.{self.name}.rejected")
+                abort(503, retry_after=app.config["CHECKOUT_RETRY_AFTER"])
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.inflight -= 1
+        return wrapper
+
+
+checkout_shedder = LoadShedder("checkout", "CHECKOUT_MAX_INFLIGHT")
+
+
+COMPRESSIBLE_MIMETYPES = {
+    "text/html", "text/css", "text/plain", "application/json", "application/javascript", "image/svg+xml",
+}
+
+
+def compression_encodings() -> list[str]:
+    return ["br", "gzip"] if brotli else ["gzip"]
+
+
+def make_compressor(encoding: str):
+    """Return (compress, flush, finish) callables for one response body."""
+    if encoding == "br":
+        c = brotli.Compressor(quality=app.config["COMPRESS_BR_QUALITY"])
+        return c.process, c.flush, c.finish
+    c = zlib.compressobj(app.config["COMPRESS_LEVEL"], zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+
+def record_compression(endpoint: str, bytes_in: int, bytes_out: int, cpu_seconds: float) -> None:
+    record_metric(f"compress.{endpoint}.bytes_in", bytes_in)
+    record_metric(f"compress.{endpoint}.bytes_out", bytes_out)
+    record_metric(f"compress.{endpoint}.cpu_ms", cpu_seconds * 1000)
+
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(compression_encodings())
+    if not encoding:
+        return response
+
+    endpoint = request.endpoint or "unknown"
+    compress, flush, finish = make_compressor(encoding)
+
+    if response.is_streamed:
+        # Flush after every chunk so the browser can render rows as they arrive.
+        chunks = response.response
+
+        def generate():
+            bytes_in = bytes_out = 0
+            cpu = 0.0
+            try:
+                for chunk in chunks:
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode("utf-8")
+                    started = time.thread_time()
+                    out = compress(chunk) + flush()
+                    cpu += time.thread_time() - started
+                    bytes_in += len(chunk)
+                    bytes_out += len(out)
+                    if out:
+                        yield out
+                started = time.thread_time()
+                out = finish()
+                cpu += time.thread_time() - started
+                bytes_out += len(out)
+                yield out
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+                record_compression(endpoint, bytes_in, bytes_out, cpu)
+
+        response.response = generate()
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < app.config["COMPRESS_MIN_SIZE"]:
+            return response
+        started = time.thread_time()
+        body = compress(data) + finish()
+        record_compression(endpoint, len(data), len(body), time.thread_time() - started)
+        response.set_data(body)
+
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+PRICE_BUCKETS = [(0, 25), (25, 50), (50, 100), (100, None)]
+PRICE_BUCKET_LABELS = [f"{low}-{high}" if high else f"{low}+" for low, high in PRICE_BUCKETS]
+
+
+def price_bucket(price) -> str:
+    p = money(price)
+    for (_, high), label in zip(PRICE_BUCKETS, PRICE_BUCKET_LABELS):
+        if high is None or p < high:
+            return label
+    return PRICE_BUCKET_LABELS[-1]
+
+
+class FacetIndex:
+    """In-memory posting lists for the storefront filters.
+
+    For every facet value (gender, size, color, price bucket) we keep the set of
+    ModelIDs that have at least one sellable item with that value at the store
+    (PlaceID=1). Combined filters are set intersections, so counts for every
+    value come from memory. Models touched by a write are queued with
+    invalidate() and reloaded on the next lookup; a full rebuild happens every
+    FACET_TTL_SECONDS so writes made in other worker processes show up too.
+    """
+
+    FACETS = ("gender", "size", "color", "price")
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._built_at = 0.0
+        self._dirty: set[int] = set()
+        self._postings: dict[str, dict[str, set[int]]] = {f: {} for f in self.FACETS}
+        self._values: dict[int, dict[str, set[str]]] = {}
+
+    def _load(self, model_ids=None) -> dict[int, dict[str, set[str]]]:
+        sql = """
+            SELECT m.ModelID, m.Gender, m.Sell_Price, it.Size, it.Color
+            FROM Model m
+            JOIN Item it ON it.ModelID = m.ModelID
+            JOIN Inventory inv ON inv.ItemID = it.ItemID AND inv.PlaceID = 1
+            WHERE inv.Quantity - inv.ReservedQuantity > 0
+        """
+        params = ()
+        if model_ids is not None:
+            params = tuple(model_ids)
+            sql += f" AND m.ModelID IN ({sql_in(params)})"
+
+        values: dict[int, dict[str, set[str]]] = {}
+        for r in fetch_all_primary(sql, params):
+            v = values.setdefault(r["ModelID"], {f: set() for f in self.FACETS})
+            if r["Gender"]:
+                v["gender"].add(r["Gender"])
+            if r["Size"]:
+                v["size"].add(r["Size"])
+            if r["Color"]:
+                v["color"].add(r["Color"])
+            v["price"].add(price_bucket(r["Sell_Price"]))
+        return values
+
+    def _drop(self, model_id: int) -> None:
+        for facet, vals in self._values.pop(model_id, {}).items():
+            for val in vals:
+                posting = self._postings[facet].get(val)
+                if posting is not None:
+                    posting.discard(model_id)
+                    if not posting:
+                        del self._postings[facet][val]
+
+    def _add(self, model_id: int, vals: dict[str, set[str]]) -> None:
+        self._values[model_id] = vals
+        for facet, facet_vals in vals.items():
+            for val in facet_vals:
+                self._postings[facet].setdefault(val, set()).add(model_id)
+
+    def invalidate(self, model_ids) -> None:
+        with self._lock:
+            self._dirty.update(model_ids)
+
+    def _ensure_fresh(self) -> None:
+        if time.monotonic() - self._built_at > self.ttl:
+            values = self._load()
+            self._postings = {f: {} for f in self.FACETS}
+            self._values = {}
+            for model_id, vals in values.items():
+                self._add(model_id, vals)
+            self._dirty.clear()
+            self._built_at = time.monotonic()
+        elif self._dirty:
+            dirty = sorted(self._dirty)
+            values = self._load(dirty)
+            for model_id in dirty:
+                self._drop(model_id)
+                if model_id in values:
+                    self._add(model_id, values[model_id])
+            self._dirty.clear()
+
+    def search(self, selected: dict[str, str]) -> tuple[set[int], dict[str, list[tuple[str, int]]]]:
+        """Return (matching in-stock ModelIDs, {facet: [(value, count), ...]})."""
+        with self._lock:
+            self._ensure_fresh()
+            everything = set(self._values)
+
+            def matching(skip: str | None = None) -> set[int]:
+                result = everything
+                for facet, val in selected.items():
+                    if val and facet != skip:
+                        result = result & self._postings[facet].get(val, set())
+                return result
+
+            counts = {}
+            for facet in self.FACETS:
+                base = matching(skip=facet)
+                order = PRICE_BUCKET_LABELS.index if facet == "price" else str
+                counts[facet] = sorted(
+                    ((val, len(posting & base)) for val, posting in self._postings[facet].items()),
+                    key=lambda vc: order(vc[0]),
+                )
+            return matching(), counts
+
+
+facet_index = FacetIndex(app.config["FACET_TTL_SECONDS"])
+
+
+class AvailabilitySnapshot:
+    """Short-lived, in-process copy of each item's sellable stock and cart line fields.
+
+    cart_add serves the line (name, price, image, size, color) from it and
+    cart_add/cart_update validate stock against it optimistically. Checkout's
+    locked check stays the source of truth. Stock writes and model/item edits
+    invalidate their entries after commit, so local edits apply immediately;
+    edits made by other worker processes show up once the snapshot is older
+    than the TTL and the whole catalog is reloaded in one query. Invalidated
+    (or never seen) items are loaded individually on their next lookup.
+    """
+
+    SELECT = """
+        SELECT it.ItemID, it.ModelID, it.Size, it.Color,
+               m.Name, m.Sell_Price, m.Item_Image,
+               GREATEST(COALESCE(inv.Quantity, 0) - COALESCE(inv.ReservedQuantity, 0), 0) AS Available
+        FROM Item it
+        JOIN Model m ON m.ModelID = it.ModelID
+        LEFT JOIN Inventory inv ON inv.ItemID = it.ItemID AND inv.PlaceID = 1
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._items: dict[int, dict] = {}
+
+    def get_many(self, item_ids) -> dict[int, dict]:
+        ids = {int(i) for i in item_ids}
+        with self._lock:
+            if time.monotonic() - self._loaded_at > self.ttl:
+                self._items = {r["ItemID"]: r for r in fetch_all_primary(self.SELECT)}
+                self._loaded_at = time.monotonic()
+                record_metric("availability.full_reload")
+            missing = tuple(sorted(ids - set(self._items)))
+            if missing:
+                for r in fetch_all_primary(self.SELECT + f" WHERE it.ItemID IN ({sql_in(missing)})", missing):
+                    self._items[r["ItemID"]] = r
+                record_metric("availability.miss", len(missing))
+            return {i: dict(self._items[i]) for i in ids if i in self._items}
+
+    def get(self, item_id: int) -> dict | None:
+        return self.get_many((item_id,)).get(int(item_id))
+
+    def prime(self, model: dict, items) -> None:
+        """Store rows model_detail just read, so the add-to-cart that follows is a hit."""
+        with self._lock:
+            for it in items:
+                self._items[it["ItemID"]] = {
+                    "ItemID": it["ItemID"],
+                    "ModelID": model["ModelID"],
+                    "Size": it["Size"],
+                    "Color": it["Color"],
+                    "Name": model["Name"],
+                    "Sell_Price": model["Sell_Price"],
+                    "Item_Image": model["Item_Image"],
+                    "Available": it["Stock"],
+                }
+
+    def invalidate(self, item_ids) -> None:
+        with self._lock:
+            for i in item_ids:
+                self._items.pop(int(i), None)
+
+    def invalidate_models(self, model_ids) -> None:
+        ids = set(model_ids)
+        with self._lock:
+            self._items = {i: r for i, r in self._items.items() if r["ModelID"] not in ids}
+
+
+availability = AvailabilitySnapshot(app.config["AVAILABILITY_TTL_SECONDS"])
+
+
+class QueryCache:
+    """In-process cache of small query results, each stored under one or more tags.
+
+    Routes that change the underlying rows call invalidate(tag) after committing.
+    Other worker processes don't see that, so entries also expire after the TTL.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._entries: dict[tuple, tuple[float, frozenset, tuple]] = {}
+
+    def fetch_all(self, query: str, params: tuple = (), tags=()) -> tuple:
+        key = (query, tuple(params))
+        with self._lock:
+            entry = self._entries.get(key)
+            generation = self._generation
+        if entry and time.monotonic() - entry[0] <= self.ttl:
+            record_metric("query_cache.hit")
+            return entry[2]
+        rows = tuple(fetch_all(query, params))
+        with self._lock:
+            # Skip storing if an invalidation ran while we were querying.
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic(), frozenset(tags), rows)
+        record_metric("query_cache.miss")
+        return rows
+
+    def invalidate(self, *tags) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries = {k: e for k, e in self._entries.items() if not e[1] & set(tags)}
+
+
+reference_cache = QueryCache(app.config["REFERENCE_CACHE_TTL_SECONDS"])
+
+
+def cached_suppliers():
+    return reference_cache.fetch_all("SELECT * FROM Supplier ORDER BY Name ASC", tags=("suppliers",))
+
+
+def cached_places():
+    return reference_cache.fetch_all("SELECT * FROM Place ORDER BY PlaceID ASC", tags=("places",))
+
+
+def cached_positions():
+    return reference_cache.fetch_all("""
+        SELECT DISTINCT Position FROM Employee
+        WHERE Position IS NOT NULL AND Position != ''
+        ORDER BY Position
+    """, tags=("positions",))
+
+
+def sync_low_stock(cur, place_id: int, item_ids) -> None:
+    """Add/refresh/remove LowStockItem rows for the given items at one place."""
+    ids = tuple(sorted(set(item_ids)))
+    if not ids:
+        return
+    cur.execute(f"""
+        INSERT INTO LowStockItem (PlaceID, ItemID, Available, Threshold)
+        SELECT * FROM (
+            SELECT inv.PlaceID, inv.ItemID,
+                   GREATEST(inv.Quantity - inv.ReservedQuantity, 0) AS Available,
+                   it.LowStockThreshold AS Threshold
+            FROM Inventory inv
+            JOIN Item it ON it.ItemID = inv.ItemID
+            WHERE inv.PlaceID = %s AND inv.ItemID IN ({sql_in(ids)})
+              AND inv.Quantity - inv.ReservedQuantity < it.LowStockThreshold
+        ) AS low
+        ON DUPLICATE KEY UPDATE Available = low.Available, Threshold = low.Threshold
+    """, (place_id, *ids))
+    cur.execute(f"""
+        DELETE ls FROM LowStockItem ls
+        JOIN Inventory inv ON inv.PlaceID = ls.PlaceID AND inv.ItemID = ls.ItemID
+        JOIN Item it ON it.ItemID = ls.ItemID
+        WHERE ls.PlaceID = %s AND ls.ItemID IN ({sql_in(ids)})
+          AND inv.Quantity - inv.ReservedQuantity >= it.LowStockThreshold
+    """, (place_id, *ids))
+
+
+def add_model_stock(cur, place_id: int, model_deltas) -> None:
+    """Apply {ModelID: (quantity delta, reserved delta)} to the ModelStock rows at one place.
+
+    Rows are upserted one by one in ModelID order, touching only the models the caller
+    changed, so concurrent writers lock the same rows in the same order. A row left at
+    0/0 is deleted, so removing a model's last item leaves nothing behind.
+    """
+    for model_id in sorted(model_deltas):
+        dq, dr = model_deltas[model_id]
+        if not dq and not dr:
+            continue
+        cur.execute("""
+            INSERT INTO ModelStock (ModelID, PlaceID, Quantity, ReservedQuantity)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE Quantity = Quantity + %s, ReservedQuantity = ReservedQuantity + %s
+        """, (model_id, place_id, dq, dr, dq, dr))
+        if dq < 0 or dr < 0:
+            cur.execute("""
+                DELETE FROM ModelStock
+                WHERE ModelID=%s AND PlaceID=%s AND Quantity=0 AND ReservedQuantity=0
+            """, (model_id, place_id))
+
+
+def stock_changed(place_id: int, deltas, cur=None) -> None:
+    """Call after any write to Inventory (same transaction) to keep derived stock data current.
+
+    ``deltas`` maps each touched ItemID to the (Quantity, ReservedQuantity) change this
+    transaction made to its Inventory row at ``place_id``. In-process caches are
+    invalidated only once the caller commits with commit().
+    """
+    ids = tuple(sorted(deltas))
+    if not ids:
+        return
+    own_cursor = cur is None
+    if own_cursor:
+        cur = mysql.connection.cursor()
+    try:
+        sync_low_stock(cur, place_id, ids)
+        if place_id == 1:
+            after_commit(lambda: availability.invalidate(ids))
+        cur.execute(f"SELECT ItemID, ModelID FROM Item WHERE ItemID IN ({sql_in(ids)})", ids)
+        model_deltas: dict[int, tuple[int, int]] = {}
+        for r in cur.fetchall():
+            dq, dr = deltas[r["ItemID"]]
+            q, rq = model_deltas.get(r["ModelID"], (0, 0))
+            model_deltas[r["ModelID"]] = (q + int(dq), rq + int(dr))
+        add_model_stock(cur, place_id, model_deltas)
+        after_commit(lambda: facet_index.invalidate(model_deltas))
+    finally:
+        if own_cursor:
+            cur.close()
+
+
 def get_current_supplier_id() -> int | None:
-    """Return Supplier.SupplierID for the currently logged-in supplier user, else None."""
+    """Return Supplier.SupplierID for the currently logged-in supplier user, else None.
+
+    Resolved once per login and kept in the session.
+    """
     if not session.get("user_id"):
         return None
+    if session.get("supplier_id"):
+        return int(session["supplier_id"])
     row = fetch_one("SELECT SupplierID FROM Supplier WHERE UserID=%s", (session["user_id"],))
-    return int(row["SupplierID"]) if row else None
+    if not row:
+        return None
+    session["supplier_id"] = int(row["SupplierID"])
+    return session["supplier_id"]
 
 
 def invoice_has_status() -> bool:
@@ -144,6 +1002,7 @@ def inv_status_sql_insert():
 
 
 @app.route("/register", methods=["GET", "POST"])
+@rate_limited("register", capacity=5, per_minute=5)
 def register():
     if request.method == "GET":
         return render_template("register.html")
@@ -182,6 +1041,7 @@ def register():
 
 
 @app.route("/login", methods=["GET", "POST"])
+@rate_limited("login", capacity=10, per_minute=10)
 def login():
     if request.method == "GET":
         return render_template("login.html")
@@ -206,6 +1066,7 @@ def login():
     if session["role"] == "Employee":
         return redirect(url_for("employee_invoices"))
     if session["role"] == "Supplier":
+        get_current_supplier_id()
         return redirect(url_for("supplier_supply_orders"))
     return redirect(url_for("home"))
 
@@ -218,31 +1079,72 @@ def logout():
 
 
 
+HOME_SQL = """
+    SELECT * FROM Model
+    WHERE (%(q)s IS NULL OR Name LIKE %(q)s OR Description LIKE %(q)s)
+      AND (%(gender)s IS NULL OR Gender = %(gender)s)
+    """
+HOME_ORDERS = {"newest": "ModelID DESC"}
+HOME_QUERY = QueryShape("home", HOME_SQL, orders=HOME_ORDERS, default_order="newest")
+
+# Facet filters restrict ModelID with an IN list padded to a power-of-two length
+# (ModelID 0 never exists), so a primary-key range lookup is used and there is one
+# statement text per bucket instead of one per selection.
+HOME_IDS_MIN_BUCKET = 8
+_home_ids_queries: dict[int, QueryShape] = {}
+
+
+def home_ids_query(model_ids) -> tuple[QueryShape, dict]:
+    """Return the padded-IN shape for len(model_ids) and its id0..idN params."""
+    ids = sorted(model_ids)
+    bucket = HOME_IDS_MIN_BUCKET
+    while bucket < len(ids):
+        bucket *= 2
+    shape = _home_ids_queries.get(bucket)
+    if shape is None:
+        placeholders = ", ".join(f"%(id{i})s" for i in range(bucket))
+        shape = _home_ids_queries.setdefault(bucket, QueryShape(
+            f"home_ids{bucket}",
+            f"{HOME_SQL}  AND ModelID IN ({placeholders})\n",
+            orders=HOME_ORDERS,
+            default_order="newest",
+        ))
+    ids += [0] * (bucket - len(ids))
+    return shape, {f"id{i}": v for i, v in enumerate(ids)}
+
+
 @app.route("/")
+@replica_reads
 def home():
     q = (request.args.get("q") or "").strip()
     gender = (request.args.get("gender") or "").strip()
+    size = (request.args.get("size") or "").strip()
+    color = (request.args.get("color") or "").strip()
+    price = (request.args.get("price") or "").strip()
 
-    sql = "SELECT * FROM Model WHERE 1=1"
-    params = []
-
-    if q:
-        sql += " AND (Name LIKE %s OR Description LIKE %s)"
-        like = f"%{q}%"
-        params.extend([like, like])
-
-    if gender in {"Male", "Female", "Both"}:
-        sql += " AND Gender = %s"
-        params.append(gender)
+    selected = {"gender": gender, "size": size, "color": color, "price": price}
+    in_stock_ids, facets = facet_index.search(selected)
 
-    sql += " ORDER BY ModelID DESC"
-    models = fetch_all(sql, tuple(params))
+    params = {
+        "q": f"%{q}%" if q else None,
+        "gender": gender if gender in {"Male", "Female", "Both"} else None,
+    }
+    # Size/color/price filters only make sense for models that are in stock.
+    if size or color or price:
+        shape, id_params = home_ids_query(in_stock_ids)
+        models = shape.fetch_all({**params, **id_params})
+    else:
+        models = HOME_QUERY.fetch_all(params)
 
     qty, total = cart_totals(get_cart())
-    return render_template("home.html", models=models, q=q, gender=gender, cart_qty=qty, cart_total=total)
+    return render_template(
+        "home.html", models=models, q=q, gender=gender, size=size, color=color, price=price,
+        facets=facets, cart_qty=qty, cart_total=total,
+    )
 
 
 @app.route("/model/<int:model_id>")
+@replica_reads
 def model_detail(model_id):
     model = fetch_one("SELECT * FROM Model WHERE ModelID=%s", (model_id,))
     if not model:
@@ -255,6 +1157,9 @@ def model_detail(model_id):
         JOIN Inventory inv ON inv.ItemID = i.ItemID AND inv.PlaceID=1
         WHERE i.ModelID=%s
     """, (model_id,))
+    # Replica stock may lag; only primary reads are trusted to seed the snapshot.
+    if not g.get("use_replica"):
+        availability.prime(model, items)
 
     return render_template("model_detail.html", model=model, items=items)
 
@@ -277,27 +1182,16 @@ def cart_page():
 
 
 @app.route("/cart/add", methods=["POST"])
+@rate_limited("cart_add", capacity=30, per_minute=60)
 def cart_add():
     item_id = request.form.get("item_id", type=int)
     if not item_id:
         abort(400)
 
-    row = fetch_one("""
-        SELECT i.ItemID, i.Size, i.Color, i.ModelID,
-               m.Name, m.Sell_Price, m.Item_Image
-        FROM Item i
-        JOIN Model m ON m.ModelID = i.ModelID
-        WHERE i.ItemID = %s
-    """, (item_id,))
+    row = availability.get(item_id)
     if not row:
         abort(404)
-
-    stock_row = fetch_one("""
-        SELECT GREATEST(Quantity - ReservedQuantity, 0) AS AvailableStock
-        FROM Inventory
-        WHERE PlaceID=1 AND ItemID=%s
-    """, (item_id,))
-    available = int(stock_row["AvailableStock"])
+    available = int(row["Available"])
 
     if available == 0:
         flash("Item is out of stock.", "error")
@@ -329,6 +1223,7 @@ def cart_add():
 @app.route("/cart/update", methods=["POST"])
 def cart_update():
     cart = get_cart()
+    snapshot = availability.get_many(cart.keys())
     for key in list(cart.keys()):
         qty = request.form.get(f"qty_{key}", type=int)
         if qty is None:
@@ -337,12 +1232,7 @@ def cart_update():
             cart.pop(key, None)
             continue
 
-        stock_row = fetch_one("""
-            SELECT GREATEST(Quantity - ReservedQuantity, 0) AS AvailableStock
-            FROM Inventory
-            WHERE PlaceID=1 AND ItemID=%s
-        """, (int(key),))
-        available = int(stock_row["AvailableStock"])
+        available = int(snapshot.get(int(key), {}).get("Available", 0))
 
         if available == 0:
             cart.pop(key, None)
@@ -369,7 +1259,9 @@ def cart_clear():
 
 
 @app.route("/checkout", methods=["GET", "POST"])
+@rate_limited("checkout", capacity=5, per_minute=10)
 @role_required("Customer")
+@checkout_shedder
 def checkout():
     cart = get_cart()
     qty, total = cart_totals(cart)
@@ -386,16 +1278,47 @@ def checkout():
                 WHERE PlaceID=1 AND ItemID=%s
             """, (int(key),))
             row["available_stock"] = int(stock_row["AvailableStock"])
-        return render_template("checkout.html", cart=cart, cart_qty=qty, cart_total=total)
+        return render_template(
+            "checkout.html", cart=cart, cart_qty=qty, cart_total=total,
+            checkout_token=uuid.uuid4().hex,
+        )
 
     customer_id = session["user_id"]
+    token = request.form.get("checkout_token") or ""
+    if not re.fullmatch(r"[0-9a-f]{32}", token):
+        flash("Your checkout form expired. Please confirm again.", "warning")
+        return redirect(url_for("checkout"))
+
+    # Claim the token before touching Inventory. A retried POST blocks here until
+    # the first attempt commits, then hits the duplicate key and gets its invoice.
+    try:
+        execute("INSERT INTO CheckoutToken (Token, CustomerID) VALUES (%s, %s)", (token, customer_id))
+    except Exception as e:
+        rollback()
+        msg = str(e)
+        if "Duplicate" not in msg and "1062" not in msg:
+            flash(f"Database error during checkout: {e}", "error")
+            return redirect(url_for("checkout"))
+
+        row = fetch_one(
+            "SELECT InvoiceID FROM CheckoutToken WHERE Token=%s AND CustomerID=%s",
+            (token, customer_id),
+        )
+        if not row or not row["InvoiceID"]:
+            flash("This order is already being placed.", "warning")
+            return redirect(url_for("my_invoices"))
+
+        # The first attempt cleared the cart it ordered; anything in it now was added since.
+        flash(f"Order already placed as Invoice #{row['InvoiceID']}.", "success")
+        return redirect(url_for("my_invoices"))
 
     try:
         cur = mysql.connection.cursor()
 
-        for key, row in cart.items():
+        # Lock Inventory rows in ItemID order, the same order completion uses.
+        for key in sorted(cart, key=int):
             item_id = int(key)
-            want = int(row["qty"])
+            want = int(cart[key]["qty"])
             cur.execute("""
                 SELECT Quantity - ReservedQuantity AS AvailableStock
                 FROM Inventory
@@ -403,15 +1326,21 @@ def checkout():
             """, (item_id,))
             available = int(cur.fetchone()["AvailableStock"])
             if available < want:
-                mysql.connection.rollback()
+                rollback()
                 cur.close()
+                availability.invalidate((item_id,))
                 flash(f"Not enough stock for Item #{item_id}. Available: {available}.", "error")
                 return redirect(url_for("cart_page"))
 
+        first = next(iter(cart.values()))
+        first_name = f"{first['name']} ({first.get('size') or '-'} / {first.get('color') or '-'})"
+
         cur.execute("""
-            INSERT INTO Invoice (CustomerID, EmployeeID, TotalAmount, Date)
-            VALUES (%s, %s, %s, %s)
-        """, (customer_id, None, float(total), date.today().isoformat()))
+            INSERT INTO Invoice (CustomerID, EmployeeID, TotalAmount, Date,
+                                 LineCount, FirstItemName, Thumbnail)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (customer_id, None, float(total), date.today().isoformat(),
+              len(cart), first_name[:150], first.get("image") or "default.png"))
         invoice_id = cur.lastrowid
 
         for key, row in cart.items():
@@ -420,9 +1349,12 @@ def checkout():
             amount = float(row["sell_price"]) * qty_line
 
             cur.execute("""
-                INSERT INTO Orders (InvoiceID, ItemID, Quantity, Amount)
-                VALUES (%s, %s, %s, %s)
-            """, (invoice_id, item_id, qty_line, amount))
+                INSERT INTO Orders (InvoiceID, ItemID, Quantity, Amount, UnitCost)
+                SELECT %s, it.ItemID, %s, %s, m.Price
+                FROM Item it
+                JOIN Model m ON m.ModelID = it.ModelID
+                WHERE it.ItemID = %s
+            """, (invoice_id, qty_line, amount, item_id))
 
             cur.execute("""
                 UPDATE Inventory
@@ -430,7 +1362,17 @@ def checkout():
                 WHERE PlaceID=1 AND ItemID=%s
             """, (qty_line, item_id))
 
-        mysql.connection.commit()
+        cur.execute("""
+            INSERT INTO Reservation (InvoiceID, PlaceID, ItemID, Quantity, ExpiresAt)
+            SELECT InvoiceID, 1, ItemID, SUM(Quantity), NOW() + INTERVAL %s MINUTE
+            FROM Orders
+            WHERE InvoiceID=%s
+            GROUP BY InvoiceID, ItemID
+        """, (app.config["RESERVATION_TTL_MINUTES"], invoice_id))
+        stock_changed(1, {int(k): (0, int(row["qty"])) for k, row in cart.items()}, cur)
+        cur.execute("UPDATE CheckoutToken SET InvoiceID=%s WHERE Token=%s", (invoice_id, token))
+
+        commit()
         cur.close()
 
         session.pop("cart", None)
@@ -438,25 +1380,76 @@ def checkout():
         return redirect(url_for("my_invoices"))
 
     except Exception as e:
-        mysql.connection.rollback()
+        rollback()
         flash(f"Database error during checkout: {e}", "error")
         return redirect(url_for("checkout"))
 
 
+@app.cli.command("backfill-invoice-summaries")
+def backfill_invoice_summaries_command():
+    """Fill LineCount/FirstItemName/Thumbnail on invoices created before they existed."""
+    cur = mysql.connection.cursor()
+    cur.execute("""
+        UPDATE Invoice i
+        JOIN (
+            SELECT InvoiceID, COUNT(*) AS LineTotal, MIN(OrderID) AS FirstOrderID
+            FROM Orders
+            GROUP BY InvoiceID
+        ) s ON s.InvoiceID = i.InvoiceID
+        JOIN Orders fo ON fo.OrderID = s.FirstOrderID
+        JOIN Item it ON it.ItemID = fo.ItemID
+        JOIN Model m ON m.ModelID = it.ModelID
+        SET i.LineCount = s.LineTotal,
+            i.FirstItemName = LEFT(CONCAT(m.Name, ' (', COALESCE(it.Size, '-'), ' / ',
+                                          COALESCE(it.Color, '-'), ')'), 150),
+            i.Thumbnail = COALESCE(m.Item_Image, 'default.png')
+        WHERE i.LineCount = 0
+    """)
+    mysql.connection.commit()
+    click.echo(f"Backfilled {cur.rowcount} invoice summary(ies).")
+    cur.close()
+
+
+MY_INVOICES_PAGE_SIZE = 20
+
+
 @app.route("/my_invoices")
 @role_required("Customer")
 def my_invoices():
+    """Customer history: one keyset-paginated query on (CustomerID, InvoiceID)."""
     cid = session["user_id"]
-    invoices = fetch_all(
-        f"""
-        SELECT i.InvoiceID, i.Date, i.TotalAmount, {inv_status_sql_select()}, i.EmployeeID
-        FROM Invoice i
-        WHERE i.CustomerID=%s
-        ORDER BY i.InvoiceID DESC
-        """,
-        (cid,),
-    )
-    return render_template("my_invoices.html", invoices=invoices)
+    before = request.args.get("before", type=int)
+
+    # Each branch is a keyset read on its own (CustomerID, InvoiceID) index; archived
+    # invoices have lower IDs, so the archive branch only matters on late pages.
+    before_sql = " AND i.InvoiceID < %s" if before else ""
+    branch_params = [cid, before] if before else [cid]
+    limit = MY_INVOICES_PAGE_SIZE + 1
+    sql = f"""
+        SELECT * FROM (
+            (SELECT i.InvoiceID, i.Date, i.TotalAmount, {inv_status_sql_select()}, i.EmployeeID,
+                    i.LineCount, i.FirstItemName, i.Thumbnail
+             FROM Invoice i
+             WHERE i.CustomerID=%s{before_sql}
+             ORDER BY i.InvoiceID DESC LIMIT %s)
+            UNION ALL
+            (SELECT i.InvoiceID, i.Date, i.TotalAmount, i.Status, i.EmployeeID,
+                    i.LineCount, i.FirstItemName, i.Thumbnail
+             FROM InvoiceArchive i
+             WHERE i.CustomerID=%s{before_sql}
+             ORDER BY i.InvoiceID DESC LIMIT %s)
+        ) AS history
+        ORDER BY InvoiceID DESC LIMIT %s
+    """
+    params = [*branch_params, limit, *branch_params, limit, limit]
+
+    invoices = fetch_all(sql, tuple(params))
+    next_before = None
+    if len(invoices) > MY_INVOICES_PAGE_SIZE:
+        invoices = invoices[:MY_INVOICES_PAGE_SIZE]
+        next_before = invoices[-1]["InvoiceID"]
+
+    return render_template("my_invoices.html", invoices=invoices, before=before, next_before=next_before)
 
 
 @app.route("/my_invoices/<int:invoice_id>")
@@ -472,29 +1465,33 @@ def my_invoice_view(invoice_id: int):
         sql_constraint = ""
         params = (invoice_id,)
 
-    invoice = fetch_one(
-        f"""
-        SELECT i.*,
-               emp.Name AS EmployeeName,
-               cust.Name AS CustomerName,
-               cust.Email AS CustomerEmail,
-               cust.Phone_Number AS CustomerPhone,
-               cust.Address AS CustomerAddress
-        FROM Invoice i
-        LEFT JOIN User emp ON emp.UserID = i.EmployeeID
-        LEFT JOIN User cust ON cust.UserID = i.CustomerID
-        WHERE i.InvoiceID = %s {sql_constraint}
-        """,
-        params,
-    )
+    # Old Completed invoices live in the archive tables.
+    for invoice_table, orders_table in (("Invoice", "Orders"), ("InvoiceArchive", "OrdersArchive")):
+        invoice = fetch_one(
+            f"""
+            SELECT i.*,
+                   emp.Name AS EmployeeName,
+                   cust.Name AS CustomerName,
+                   cust.Email AS CustomerEmail,
+                   cust.Phone_Number AS CustomerPhone,
+                   cust.Address AS CustomerAddress
+            FROM {invoice_table} i
+            LEFT JOIN User emp ON emp.UserID = i.EmployeeID
+            LEFT JOIN User cust ON cust.UserID = i.CustomerID
+            WHERE i.InvoiceID = %s {sql_constraint}
+            """,
+            params,
+        )
+        if invoice:
+            break
     if not invoice:
         abort(404)
 
     lines = fetch_all(
-        """
+        f"""
         SELECT o.OrderID, o.ItemID, o.Quantity, o.Amount,
                m.Name AS ModelName, it.Size, it.Color
-        FROM Orders o
+        FROM {orders_table} o
         JOIN Item it ON it.ItemID = o.ItemID
         JOIN Model m ON m.ModelID = it.ModelID
         WHERE o.InvoiceID = %s
@@ -598,6 +1595,82 @@ def employee_prepare_invoice(invoice_id: int):
     return redirect(url_for("employee_invoices"))
 
 
+def complete_invoices(cur, invoice_ids) -> None:
+    """Ship the stock of already-locked Accepted/Prepared invoices in one pass.
+
+    Inventory rows are locked in ItemID order first so concurrent completions
+    (and checkout, which locks in the same order) cannot deadlock, then all
+    lines are applied with one grouped UPDATE ... JOIN instead of one
+    statement per order line.
+    """
+    ids = tuple(sorted(invoice_ids))
+    if not ids:
+        return
+
+    cur.execute(f"""
+        SELECT ItemID FROM Inventory
+        WHERE PlaceID=1 AND ItemID IN (
+            SELECT ItemID FROM Orders WHERE InvoiceID IN ({sql_in(ids)})
+        )
+        ORDER BY ItemID
+        FOR UPDATE
+    """, ids)
+    locked = {r["ItemID"] for r in cur.fetchall()}
+    cur.execute(
+        f"SELECT ItemID, SUM(Quantity) AS Qty FROM Orders WHERE InvoiceID IN ({sql_in(ids)}) GROUP BY ItemID",
+        ids,
+    )
+    deltas = {r["ItemID"]: (-int(r["Qty"]), -int(r["Qty"])) for r in cur.fetchall() if r["ItemID"] in locked}
+
+    cur.execute(f"""
+        UPDATE Inventory inv
+        JOIN (
+            SELECT ItemID, SUM(Quantity) AS Qty
+            FROM Orders
+            WHERE InvoiceID IN ({sql_in(ids)})
+            GROUP BY ItemID
+        ) o ON o.ItemID = inv.ItemID
+        SET inv.Quantity = inv.Quantity - o.Qty,
+            inv.ReservedQuantity = inv.ReservedQuantity - o.Qty
+        WHERE inv.PlaceID = 1
+    """, ids)
+
+    cur.execute(
+        f"UPDATE Reservation SET ReleasedAt=NOW() WHERE InvoiceID IN ({sql_in(ids)}) AND ReleasedAt IS NULL",
+        ids,
+    )
+    cur.execute(f"UPDATE Invoice SET Status='Completed' WHERE InvoiceID IN ({sql_in(ids)})", ids)
+    record_sales(cur, ids)
+    stock_changed(1, deltas, cur)
+
+
+# Lines without a captured UnitCost (placed before it existed) fall back to the model's current Price.
+SALES_BUCKET_SELECT = """
+    SELECT COALESCE(i.Date, CURDATE()) AS SaleDate, o.ItemID, it.ModelID,
+           SUM(o.Quantity) AS Qty,
+           SUM(o.Amount) AS Revenue,
+           SUM(COALESCE(o.UnitCost, m.Price, 0) * o.Quantity) AS Cost
+    FROM Orders o
+    JOIN Invoice i ON i.InvoiceID = o.InvoiceID
+    JOIN Item it ON it.ItemID = o.ItemID
+    JOIN Model m ON m.ModelID = it.ModelID
+    WHERE {where}
+    GROUP BY SaleDate, o.ItemID, it.ModelID
+"""
+
+
+def record_sales(cur, invoice_ids) -> None:
+    """Add the lines of just-completed invoices to the ItemSalesDaily buckets."""
+    ids = tuple(invoice_ids)
+    cur.execute(f"""
+        INSERT INTO ItemSalesDaily (SaleDate, ItemID, ModelID, Quantity, Revenue, Cost)
+        SELECT * FROM ({SALES_BUCKET_SELECT.format(where=f"o.InvoiceID IN ({sql_in(ids)})")}) AS s
+        ON DUPLICATE KEY UPDATE Quantity = ItemSalesDaily.Quantity + s.Qty,
+                                Revenue = ItemSalesDaily.Revenue + s.Revenue,
+                                Cost = ItemSalesDaily.Cost + s.Cost
+    """, ids)
+
+
 @app.route("/employee/invoices/<int:invoice_id>/complete", methods=["POST"])
 @role_required("Employee")
 def employee_complete_invoice(invoice_id: int):
@@ -621,86 +1694,414 @@ def employee_complete_invoice(invoice_id: int):
             flash("Invoice must be Accepted or Prepared first.", "warning")
             return redirect(url_for("employee_invoices"))
 
-        cur.execute("SELECT ItemID, Quantity FROM Orders WHERE InvoiceID=%s", (invoice_id,))
-        lines = cur.fetchall()
-
-        for ln in lines:
-            cur.execute("""
-                UPDATE Inventory
-                SET Quantity = Quantity - %s,
-                    ReservedQuantity = ReservedQuantity - %s
-                WHERE PlaceID=1 AND ItemID=%s
-            """, (ln["Quantity"], ln["Quantity"], ln["ItemID"]))
-
-        cur.execute("UPDATE Invoice SET Status='Completed' WHERE InvoiceID=%s", (invoice_id,))
-        mysql.connection.commit()
+        complete_invoices(cur, (invoice_id,))
+        commit()
         cur.close()
 
         flash(f"Invoice #{invoice_id} completed. Stock updated.", "success")
         return redirect(url_for("employee_invoices"))
 
     except Exception as e:
-        mysql.connection.rollback()
+        rollback()
         flash(f"Error completing invoice: {e}", "error")
         return redirect(url_for("employee_invoices"))
 
 
+# action -> (new status, statuses it may start from, must already be assigned to me)
+INVOICE_TRANSITIONS = {
+    "accept": ("Accepted", ("Pending",), False),
+    "prepare": ("Prepared", ("Accepted",), True),
+    "complete": ("Completed", ("Accepted", "Prepared"), True),
+}
 
-@app.route("/admin/models")
-@role_required("Admin")
-def admin_models():
-    search = request.args.get("search", "")
-    place_id = request.args.get("place_id", "")
-    min_price = request.args.get("min_price", "")
-    max_price = request.args.get("max_price", "")
-    sort_by = request.args.get("sort_by", "")
 
-    sql = """
-        SELECT 
-            m.*, 
-            COALESCE(SUM(inv.Quantity), 0) as TotalQuantity
-        FROM Model m
-        LEFT JOIN Item i ON m.ModelID = i.ModelID
-        LEFT JOIN Inventory inv ON i.ItemID = inv.ItemID
+def apply_invoice_transition(cur, emp_id: int, action: str, rows) -> dict[int, tuple[bool, str]]:
+    """Validate locked Invoice rows against INVOICE_TRANSITIONS and apply the allowed ones.
+
+    Returns {InvoiceID: (ok, message)} for every row passed in.
     """
+    new_status, from_statuses, must_own = INVOICE_TRANSITIONS[action]
+    results = {}
+    ok_ids = []
+    for r in rows:
+        if must_own and r["EmployeeID"] != emp_id:
+            results[r["InvoiceID"]] = (False, "not assigned to you")
+        elif r["Status"] not in from_statuses:
+            results[r["InvoiceID"]] = (False, f"is {r['Status']}")
+        else:
+            results[r["InvoiceID"]] = (True, new_status)
+            ok_ids.append(r["InvoiceID"])
 
-    params = []
-    conditions = []
+    if not ok_ids:
+        return results
+
+    ids = tuple(ok_ids)
+    if action == "accept":
+        cur.execute(
+            f"UPDATE Invoice SET EmployeeID=%s, Status='Accepted' WHERE InvoiceID IN ({sql_in(ids)})",
+            (emp_id, *ids),
+        )
+    elif action == "prepare":
+        cur.execute(f"UPDATE Invoice SET Status='Prepared' WHERE InvoiceID IN ({sql_in(ids)})", ids)
+    else:
+        complete_invoices(cur, ids)
+    return results
 
-    if search:
-        conditions.append("(m.Name LIKE %s OR m.Description LIKE %s OR m.ModelNumber LIKE %s)")
-        params.extend([f"%{search}%", f"%{search}%", f"%{search}%"])
 
-    if place_id and place_id != "all":
-        conditions.append("inv.PlaceID = %s")
-        params.append(place_id)
+@app.route("/employee/invoices/claim", methods=["POST"])
+@role_required("Employee")
+def employee_claim_invoices():
+    """Accept the oldest N Pending invoices nobody else is holding right now.
 
-    if min_price:
-        conditions.append("m.Sell_Price >= %s")
-        params.append(min_price)
+    FOR UPDATE SKIP LOCKED (served by idx_invoice_status) lets several employees
+    pull from the queue at once instead of queueing on the same row lock.
+    """
+    emp_id = session["user_id"]
+    want = max(1, min(request.form.get("count", type=int) or 5, 50))
+    started = time.perf_counter()
 
-    if max_price:
-        conditions.append("m.Sell_Price <= %s")
-        params.append(max_price)
+    try:
+        cur = mysql.connection.cursor()
+        cur.execute("""
+            SELECT InvoiceID, EmployeeID, Status FROM Invoice
+            WHERE Status = 'Pending'
+            ORDER BY InvoiceID
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (want,))
+        rows = cur.fetchall()
+
+        skipped = 0
+        if len(rows) < want:
+            # Pending rows we could see but not lock are held by another claimer.
+            cur.execute("""
+                SELECT COUNT(*) AS c FROM (
+                    SELECT InvoiceID FROM Invoice
+                    WHERE Status = 'Pending'
+                    ORDER BY InvoiceID
+                    LIMIT %s
+                ) q
+            """, (want,))
+            skipped = max(int(cur.fetchone()["c"]) - len(rows), 0)
+
+        apply_invoice_transition(cur, emp_id, "accept", rows)
+        commit()
+        cur.close()
 
-    if conditions:
-        sql += " WHERE " + " AND ".join(conditions)
+    except Exception as e:
+        rollback()
+        record_metric("claim.errors")
+        flash(f"Error claiming invoices: {e}", "error")
+        return redirect(url_for("employee_invoices"))
 
-    sql += " GROUP BY m.ModelID "
+    record_metric("claim.latency_ms", (time.perf_counter() - started) * 1000)
+    record_metric("claim.claimed", len(rows))
+    if skipped:
+        record_metric("claim.skipped_locked", skipped)
+    if not rows:
+        record_metric("claim.empty")
 
-    if sort_by == "quantity_desc":
-        sql += " ORDER BY TotalQuantity DESC"
-    elif sort_by == "quantity_asc":
-        sql += " ORDER BY TotalQuantity ASC"
-    elif sort_by == "price_high":
-        sql += " ORDER BY m.Sell_Price DESC"
-    elif sort_by == "price_low":
-        sql += " ORDER BY m.Sell_Price ASC"
+    if rows:
+        flash("Claimed: " + ", ".join(f"#{r['InvoiceID']}" for r in rows), "success")
     else:
-        sql += " ORDER BY m.ModelID DESC"
+        flash("No pending invoices to claim.", "warning")
+    return redirect(url_for("employee_invoices"))
+
+
+@app.route("/employee/invoices/bulk", methods=["POST"])
+@role_required("Employee")
+def employee_bulk_invoices():
+    """Accept / prepare / complete many invoices in one transaction.
+
+    Selected invoices are locked in ID order with a single SELECT ... FOR UPDATE.
+    With scope=all, "complete" picks every invoice currently assigned to me.
+    Answers JSON with the per-invoice result when the client asks for it.
+    """
+    emp_id = session["user_id"]
+    action = request.form.get("action", "")
+    if action not in INVOICE_TRANSITIONS:
+        abort(400)
+
+    selected = sorted(set(request.form.getlist("invoice_id", type=int)))
+    complete_all = action == "complete" and request.form.get("scope") == "all"
+    wants_json = request.accept_mimetypes.best == "application/json"
+
+    if not selected and not complete_all:
+        if wants_json:
+            return jsonify(action=action, results=[])
+        flash("Select at least one invoice.", "warning")
+        return redirect(url_for("employee_invoices"))
+
+    try:
+        cur = mysql.connection.cursor()
+        if complete_all:
+            cur.execute("""
+                SELECT InvoiceID, EmployeeID, Status FROM Invoice
+                WHERE EmployeeID=%s AND Status IN ('Accepted','Prepared')
+                ORDER BY InvoiceID
+                FOR UPDATE
+            """, (emp_id,))
+        else:
+            cur.execute(f"""
+                SELECT InvoiceID, EmployeeID, Status FROM Invoice
+                WHERE InvoiceID IN ({sql_in(selected)})
+                ORDER BY InvoiceID
+                FOR UPDATE
+            """, tuple(selected))
+        rows = cur.fetchall()
+
+        results = apply_invoice_transition(cur, emp_id, action, rows)
+        for missing in set(selected) - set(results):
+            results[missing] = (False, "not found")
+
+        commit()
+        cur.close()
+
+    except Exception as e:
+        rollback()
+        if wants_json:
+            return jsonify(action=action, error=str(e)), 500
+        flash(f"Error updating invoices: {e}", "error")
+        return redirect(url_for("employee_invoices"))
+
+    if wants_json:
+        return jsonify(action=action, results=[
+            {"InvoiceID": inv_id, "ok": ok, "message": msg}
+            for inv_id, (ok, msg) in sorted(results.items())
+        ])
+
+    done = [inv_id for inv_id, (ok, _) in sorted(results.items()) if ok]
+    failed = [(inv_id, msg) for inv_id, (ok, msg) in sorted(results.items()) if not ok]
+    if done:
+        flash(f"{INVOICE_TRANSITIONS[action][0]}: " + ", ".join(f"#{i}" for i in done), "success")
+    else:
+        flash("No invoices were updated.", "warning")
+    if failed:
+        flash("Skipped: " + "; ".join(f"#{i} {msg}" for i, msg in failed), "warning")
+    return redirect(url_for("employee_invoices"))
+
+
+
+def release_expired_reservations(batch_size: int | None = None) -> int:
+    """Expire one batch of stale Pending invoices and hand their reserved stock back.
+
+    Candidates come from the open-reservation index, invoices are locked in ID
+    order (skipping any an employee is accepting right now), and Inventory is
+    released with a single grouped UPDATE. Returns the number of invoices expired.
+    """
+    batch_size = batch_size or app.config["RESERVATION_SWEEP_BATCH"]
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("""
+            SELECT DISTINCT r.InvoiceID
+            FROM Reservation r
+            JOIN Invoice i ON i.InvoiceID = r.InvoiceID
+            WHERE r.ReleasedAt IS NULL AND r.ExpiresAt < NOW() AND i.Status = 'Pending'
+            ORDER BY r.InvoiceID
+            LIMIT %s
+        """, (batch_size,))
+        candidates = [r["InvoiceID"] for r in cur.fetchall()]
+        if not candidates:
+            rollback()
+            return 0
+
+        cur.execute(f"""
+            SELECT InvoiceID FROM Invoice
+            WHERE InvoiceID IN ({sql_in(candidates)}) AND Status='Pending'
+            ORDER BY InvoiceID
+            FOR UPDATE SKIP LOCKED
+        """, tuple(candidates))
+        invoice_ids = tuple(r["InvoiceID"] for r in cur.fetchall())
+
+        if invoice_ids:
+            cur.execute(
+                f"SELECT PlaceID, ItemID, SUM(Quantity) AS Qty FROM Reservation "
+                f"WHERE InvoiceID IN ({sql_in(invoice_ids)}) AND ReleasedAt IS NULL "
+                f"GROUP BY PlaceID, ItemID",
+                invoice_ids,
+            )
+            released_items: dict[int, dict[int, int]] = {}
+            for r in cur.fetchall():
+                released_items.setdefault(r["PlaceID"], {})[r["ItemID"]] = int(r["Qty"])
+
+            # Lock Inventory in (PlaceID, ItemID) order, like checkout and completion,
+            # so the sweeper can't deadlock against them.
+            pairs = sorted((place_id, item_id) for place_id, ids in released_items.items() for item_id in ids)
+            reserved: dict[tuple[int, int], int] = {}
+            if pairs:
+                cur.execute(f"""
+                    SELECT PlaceID, ItemID, ReservedQuantity FROM Inventory
+                    WHERE (PlaceID, ItemID) IN ({", ".join(["(%s, %s)"] * len(pairs))})
+                    ORDER BY PlaceID, ItemID
+                    FOR UPDATE
+                """, tuple(v for pair in pairs for v in pair))
+                reserved = {(r["PlaceID"], r["ItemID"]): int(r["ReservedQuantity"]) for r in cur.fetchall()}
+
+            cur.execute(f"""
+                UPDATE Inventory inv
+                JOIN (
+                    SELECT PlaceID, ItemID, SUM(Quantity) AS Qty
+                    FROM Reservation
+                    WHERE InvoiceID IN ({sql_in(invoice_ids)}) AND ReleasedAt IS NULL
+                    GROUP BY PlaceID, ItemID
+                ) r ON r.PlaceID = inv.PlaceID AND r.ItemID = inv.ItemID
+                SET inv.ReservedQuantity = GREATEST(inv.ReservedQuantity - r.Qty, 0)
+            """, invoice_ids)
+            cur.execute(
+                f"UPDATE Invoice SET Status='Expired' WHERE InvoiceID IN ({sql_in(invoice_ids)})",
+                invoice_ids,
+            )
+
+            cur.execute(
+                f"UPDATE Reservation SET ReleasedAt=NOW() "
+                f"WHERE InvoiceID IN ({sql_in(invoice_ids)}) AND ReleasedAt IS NULL",
+                invoice_ids,
+            )
+            for place_id, items in released_items.items():
+                stock_changed(place_id, {
+                    item_id: (0, -min(qty, reserved[(place_id, item_id)]))
+                    for item_id, qty in items.items() if (place_id, item_id) in reserved
+                }, cur)
+
+        commit()
+        return len(invoice_ids)
+    except Exception:
+        rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def sweep_reservations() -> int:
+    """Run release_expired_reservations() until a short batch says we're caught up."""
+    total = 0
+    batch_size = app.config["RESERVATION_SWEEP_BATCH"]
+    while True:
+        released = release_expired_reservations(batch_size)
+        total += released
+        if released < batch_size:
+            return total
+
+
+def purge_checkout_tokens(batch_size: int | None = None) -> int:
+    """Delete checkout tokens older than CHECKOUT_TOKEN_TTL_HOURS, in batches."""
+    batch_size = batch_size or app.config["RESERVATION_SWEEP_BATCH"]
+    total = 0
+    while True:
+        cur = mysql.connection.cursor()
+        cur.execute("""
+            DELETE FROM CheckoutToken
+            WHERE CreatedAt < NOW() - INTERVAL %s HOUR
+            LIMIT %s
+        """, (app.config["CHECKOUT_TOKEN_TTL_HOURS"], batch_size))
+        deleted = cur.rowcount
+        cur.close()
+        mysql.connection.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def start_reservation_sweeper(interval: int | None = None) -> threading.Thread | None:
+    """Start the background sweeper thread (no-op when the interval is 0).
+
+    Each pass expires stale reservations and purges old checkout tokens.
+    """
+    interval = interval if interval is not None else app.config["RESERVATION_SWEEP_INTERVAL"]
+    if interval <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    released = sweep_reservations()
+                    purge_checkout_tokens()
+                if released:
+                    app.logger.info("Reservation sweeper expired %s invoice(s).", released)
+            except Exception as e:
+                app.logger.warning("Reservation sweep failed: %s", e)
+
+    thread = threading.Thread(target=loop, name="reservation-sweeper", daemon=True)
+    thread.start()
+    return thread
+
+
+@app.cli.command("sweep-reservations")
+def sweep_reservations_command():
+    """Release stock held by Pending invoices whose reservation expired."""
+    click.echo(f"Expired {sweep_reservations()} invoice(s).")
+
+
+@app.cli.command("purge-checkout-tokens")
+def purge_checkout_tokens_command():
+    """Delete checkout idempotency tokens past their TTL."""
+    click.echo(f"Purged {purge_checkout_tokens()} token(s).")
+
+
+
+@app.route("/admin/metrics")
+@role_required("Admin")
+def admin_metrics():
+    return jsonify(metrics_snapshot())
+
+
+ADMIN_MODELS_PAGE_SIZE = 24
+# Stock per model from ModelStock, for one place or summed over all. idx_modelstock_place_qty
+# covers the one-place filter; the TotalQuantity sorts are on an aggregate and always filesort.
+ADMIN_MODELS_QUERY = QueryShape(
+    "admin_models",
+    """
+    SELECT m.*, COALESCE(ms.Quantity, 0) AS TotalQuantity
+    FROM Model m
+    LEFT JOIN (
+        SELECT ModelID, SUM(Quantity) AS Quantity
+        FROM ModelStock
+        WHERE (%(place_id)s IS NULL OR PlaceID = %(place_id)s)
+        GROUP BY ModelID
+    ) ms ON ms.ModelID = m.ModelID
+    WHERE (%(search)s IS NULL OR m.Name LIKE %(search)s
+           OR m.Description LIKE %(search)s OR m.ModelNumber LIKE %(search)s)
+      AND (%(min_price)s IS NULL OR m.Sell_Price >= %(min_price)s)
+      AND (%(max_price)s IS NULL OR m.Sell_Price <= %(max_price)s)
+    """,
+    orders={
+        "newest": "m.ModelID DESC",
+        "quantity_desc": "TotalQuantity DESC, m.ModelID DESC",
+        "quantity_asc": "TotalQuantity ASC, m.ModelID DESC",
+        "price_high": "m.Sell_Price DESC, m.ModelID DESC",
+        "price_low": "m.Sell_Price ASC, m.ModelID DESC",
+    },
+    default_order="newest",
+)
+
 
-    models = fetch_all(sql, tuple(params))
-    places = fetch_all("SELECT * FROM Place")
+@app.route("/admin/models")
+@role_required("Admin")
+@replica_reads
+def admin_models():
+    search = request.args.get("search", "")
+    place_id = request.args.get("place_id", "")
+    min_price = request.args.get("min_price", "")
+    max_price = request.args.get("max_price", "")
+    sort_by = request.args.get("sort_by", "")
+    page = max(request.args.get("page", type=int) or 1, 1)
+
+    models = ADMIN_MODELS_QUERY.fetch_all(
+        {
+            "place_id": place_id if place_id and place_id != "all" else None,
+            "search": f"%{search}%" if search else None,
+            "min_price": min_price or None,
+            "max_price": max_price or None,
+        },
+        order=sort_by,
+        limit=ADMIN_MODELS_PAGE_SIZE + 1,
+        offset=(page - 1) * ADMIN_MODELS_PAGE_SIZE,
+    )
+    has_next = len(models) > ADMIN_MODELS_PAGE_SIZE
+    models = models[:ADMIN_MODELS_PAGE_SIZE]
+    places = cached_places()
 
     return render_template(
         "admin_models.html",
@@ -711,13 +2112,32 @@ def admin_models():
         min_price=min_price,
         max_price=max_price,
         sort_by=sort_by,
+        page=page,
+        has_next=has_next,
     )
 
 
+@app.cli.command("rebuild-model-stock")
+def rebuild_model_stock_command():
+    """Recompute ModelStock from the whole Inventory table."""
+    cur = mysql.connection.cursor()
+    cur.execute("DELETE FROM ModelStock")
+    cur.execute("""
+        INSERT INTO ModelStock (ModelID, PlaceID, Quantity, ReservedQuantity)
+        SELECT it.ModelID, inv.PlaceID, SUM(inv.Quantity), SUM(inv.ReservedQuantity)
+        FROM Item it
+        JOIN Inventory inv ON inv.ItemID = it.ItemID
+        GROUP BY it.ModelID, inv.PlaceID
+    """)
+    mysql.connection.commit()
+    click.echo(f"Rebuilt {cur.rowcount} model stock row(s).")
+    cur.close()
+
+
 @app.route("/admin/models/new", methods=["GET", "POST"])
 @role_required("Admin")
 def admin_models_new():
-    suppliers = fetch_all("SELECT * FROM Supplier ORDER BY Name ASC")
+    suppliers = cached_suppliers()
 
     if request.method == "GET":
         return render_template("admin_model_form.html", model=None, suppliers=suppliers)
@@ -765,7 +2185,7 @@ def admin_models_new():
 @app.route("/admin/models/<int:model_id>/edit", methods=["GET", "POST"])
 @role_required("Admin")
 def admin_models_edit(model_id):
-    suppliers = fetch_all("SELECT * FROM Supplier ORDER BY Name ASC")
+    suppliers = cached_suppliers()
     model = fetch_one("SELECT * FROM Model WHERE ModelID=%s", (model_id,))
     if not model:
         abort(404)
@@ -805,12 +2225,14 @@ def admin_models_edit(model_id):
             """,
             (name, model_number, gender, description, price, sell_price, profit, filename, supplier_id, model_id),
         )
-        mysql.connection.commit()
+        after_commit(lambda: facet_index.invalidate((model_id,)))
+        after_commit(lambda: availability.invalidate_models((model_id,)))
+        commit()
         flash("Model updated successfully.", "success")
         return redirect(url_for("admin_models"))
 
     except Exception as e:
-        mysql.connection.rollback()
+        rollback()
         flash(f"Update error: {e}", "error")
         return redirect(url_for("admin_models_edit", model_id=model_id))
 
@@ -824,8 +2246,10 @@ def admin_models_delete(model_id):
         return redirect(url_for("admin_models"))
 
     try:
+        execute("DELETE FROM ModelStock WHERE ModelID=%s", (model_id,))
         execute("DELETE FROM Model WHERE ModelID=%s", (model_id,))
         mysql.connection.commit()
+        facet_index.invalidate((model_id,))
         flash("Model deleted.", "success")
     except Exception as e:
         mysql.connection.rollback()
@@ -869,10 +2293,11 @@ def admin_item_add(model_id):
     try:
         item_id = execute("INSERT INTO Item (ModelID, Size, Color) VALUES (%s, %s, %s)", (model_id, size, color))
         execute("INSERT INTO Inventory (ItemID, PlaceID, Quantity) VALUES (%s, 1, %s)", (item_id, stock))
-        mysql.connection.commit()
+        stock_changed(1, {item_id: (stock, 0)})
+        commit()
         flash("Variant added successfully.", "success")
     except Exception as e:
-        mysql.connection.rollback()
+        rollback()
         flash(f"Error: {e}", "error")
 
     return redirect(url_for("admin_items", model_id=model_id))
@@ -885,6 +2310,11 @@ def admin_item_stock(item_id):
 
     if new_stock is not None:
         try:
+            new_stock = int(new_stock)
+            old = fetch_one(
+                "SELECT Quantity FROM Inventory WHERE PlaceID=1 AND ItemID=%s FOR UPDATE",
+                (item_id,)
+            )
             execute(
                 """
                 INSERT INTO Inventory (ItemID, PlaceID, Quantity)
@@ -893,25 +2323,129 @@ def admin_item_stock(item_id):
                 """,
                 (item_id, new_stock, new_stock)
             )
-            mysql.connection.commit()
+            stock_changed(1, {item_id: (new_stock - (old["Quantity"] if old else 0), 0)})
+            commit()
             flash("Stock updated successfully!", "success")
         except Exception as e:
-            mysql.connection.rollback()
+            rollback()
             flash(f"Error updating stock: {e}", "error")
 
     return redirect(request.referrer)
 
 
+@app.route("/admin/item/<int:item_id>/threshold", methods=["POST"])
+@role_required("Admin")
+def admin_item_threshold(item_id):
+    threshold = request.form.get("threshold", type=int)
+    if threshold is None or threshold < 0:
+        flash("Threshold must be a number >= 0.", "error")
+        return redirect(request.referrer or url_for("admin_low_stock"))
+
+    try:
+        execute("UPDATE Item SET LowStockThreshold=%s WHERE ItemID=%s", (threshold, item_id))
+        for row in fetch_all("SELECT PlaceID FROM Inventory WHERE ItemID=%s", (item_id,)):
+            stock_changed(row["PlaceID"], {item_id: (0, 0)})
+        commit()
+        flash("Low-stock threshold updated.", "success")
+    except Exception as e:
+        rollback()
+        flash(f"Error updating threshold: {e}", "error")
+
+    return redirect(request.referrer or url_for("admin_low_stock"))
+
+
+@app.route("/admin/low_stock")
+@role_required("Admin")
+@replica_reads
+def admin_low_stock():
+    place_id = request.args.get("place_id", type=int)
+
+    sql = """
+        SELECT ls.PlaceID, ls.ItemID, ls.Available, ls.Threshold, ls.Since,
+               it.Size, it.Color, m.ModelID, m.Name AS ModelName,
+               p.Location AS PlaceLocation
+        FROM LowStockItem ls
+        JOIN Item it ON it.ItemID = ls.ItemID
+        JOIN Model m ON m.ModelID = it.ModelID
+        JOIN Place p ON p.PlaceID = ls.PlaceID
+    """
+    params = []
+    if place_id:
+        sql += " WHERE ls.PlaceID = %s"
+        params.append(place_id)
+    sql += " ORDER BY ls.Available ASC, ls.Since ASC"
+
+    items = fetch_all(sql, tuple(params))
+    places = cached_places()
+    return render_template("admin_low_stock.html", items=items, places=places, place_id=place_id)
+
+
+@app.route("/admin/low_stock/feed")
+@role_required("Admin")
+def admin_low_stock_feed():
+    """Newest low-stock entries first (?since=YYYY-MM-DD HH:MM:SS for polling)."""
+    since = request.args.get("since", "")
+    sql = """
+        SELECT ls.PlaceID, ls.ItemID, ls.Available, ls.Threshold, ls.Since,
+               m.Name AS ModelName, it.Size, it.Color
+        FROM LowStockItem ls
+        JOIN Item it ON it.ItemID = ls.ItemID
+        JOIN Model m ON m.ModelID = it.ModelID
+    """
+    params = []
+    if since:
+        sql += " WHERE ls.Since > %s"
+        params.append(since)
+    sql += " ORDER BY ls.Since DESC LIMIT 50"
+
+    rows = fetch_all(sql, tuple(params))
+    return jsonify(alerts=[{**r, "Since": str(r["Since"])} for r in rows])
+
+
+@app.cli.command("rebuild-low-stock")
+def rebuild_low_stock_command():
+    """Recompute LowStockItem from the whole Inventory table."""
+    cur = mysql.connection.cursor()
+    cur.execute("DELETE FROM LowStockItem")
+    cur.execute("""
+        INSERT INTO LowStockItem (PlaceID, ItemID, Available, Threshold)
+        SELECT inv.PlaceID, inv.ItemID,
+               GREATEST(inv.Quantity - inv.ReservedQuantity, 0),
+               it.LowStockThreshold
+        FROM Inventory inv
+        JOIN Item it ON it.ItemID = inv.ItemID
+        WHERE inv.Quantity - inv.ReservedQuantity < it.LowStockThreshold
+    """)
+    mysql.connection.commit()
+    click.echo(f"{cur.rowcount} item(s) below threshold.")
+    cur.close()
+
+
 @app.route("/admin/item/<int:item_id>/delete", methods=["POST"])
 @role_required("Admin")
 def admin_item_delete(item_id):
+    item = fetch_one("SELECT ModelID FROM Item WHERE ItemID = %s", (item_id,))
     try:
+        stock = fetch_all(
+            "SELECT PlaceID, Quantity, ReservedQuantity FROM Inventory WHERE ItemID = %s ORDER BY PlaceID FOR UPDATE",
+            (item_id,)
+        )
+        execute("DELETE FROM LowStockItem WHERE ItemID = %s", (item_id,))
         execute("DELETE FROM Inventory WHERE ItemID = %s", (item_id,))
         execute("DELETE FROM Item WHERE ItemID = %s", (item_id,))
-        mysql.connection.commit()
+        if item:
+            cur = mysql.connection.cursor()
+            for row in stock:
+                add_model_stock(cur, row["PlaceID"], {
+                    item["ModelID"]: (-row["Quantity"], -row["ReservedQuantity"])
+                })
+            cur.close()
+            after_commit(lambda: facet_index.invalidate((item["ModelID"],)))
+        after_commit(lambda: availability.invalidate((item_id,)))
+        commit()
         flash("Item deleted successfully!", "success")
     except Exception:
-        mysql.connection.rollback()
+        rollback()
         flash("Cannot delete this item because it has already been ordered by a customer.", "error")
 
     return redirect(request.referrer)
@@ -956,6 +2490,7 @@ def admin_suppliers_new():
 
         mysql.connection.commit()
         cur.close()
+        reference_cache.invalidate("suppliers")
 
         flash("Supplier account created successfully.", "success")
         return redirect(url_for("admin_suppliers"))
@@ -996,6 +2531,7 @@ def admin_suppliers_edit(supplier_id: int):
             (name, email, phone, address, supplier_id),
         )
         mysql.connection.commit()
+        reference_cache.invalidate("suppliers")
         flash("Supplier updated successfully.", "success")
         return redirect(url_for("admin_suppliers"))
     except Exception as e:
@@ -1010,6 +2546,7 @@ def admin_suppliers_delete(supplier_id):
     try:
         execute("DELETE FROM Supplier WHERE SupplierID=%s", (supplier_id,))
         mysql.connection.commit()
+        reference_cache.invalidate("suppliers")
         flash("Supplier deleted successfully.", "success")
     except Exception as e:
         mysql.connection.rollback()
@@ -1019,8 +2556,9 @@ def admin_suppliers_delete(supplier_id):
 
 @app.route("/admin/invoices")
 @role_required("Admin")
+@replica_reads
 def admin_invoices():
-    invoices = fetch_all(
+    invoices = stream_rows(
         f"""
         SELECT i.InvoiceID, i.Date, i.TotalAmount, {inv_status_sql_select()},
                cu.Name AS CustomerName,
@@ -1031,13 +2569,14 @@ def admin_invoices():
         ORDER BY i.InvoiceID DESC
         """
     )
-    return render_template("admin_invoices.html", invoices=invoices)
+    return stream_listing("admin_invoices.html", invoices=invoices)
 
 
 @app.route("/admin/orders")
 @role_required("Admin")
+@replica_reads
 def admin_orders():
-    orders = fetch_all(
+    orders = stream_rows(
         """
         SELECT o.OrderID, o.InvoiceID, o.Quantity, o.Amount,
                m.Name AS ModelName, it.Size, it.Color
@@ -1047,27 +2586,63 @@ def admin_orders():
         ORDER BY o.OrderID DESC
         """
     )
-    return render_template("admin_orders.html", orders=orders)
+    return stream_listing("admin_orders.html", orders=orders)
 
 
 @app.route("/admin/stats")
 @role_required("Admin")
+@replica_reads
 def admin_stats():
-    total_sales_data = fetch_one("SELECT SUM(TotalAmount) AS Total FROM Invoice")
-    total_sales = total_sales_data["Total"] if total_sales_data and total_sales_data["Total"] else 0
+    start_date = request.args.get("start_date", "")
+    end_date = request.args.get("end_date", "")
 
-    invoice_count = fetch_one("SELECT COUNT(*) AS Count FROM Invoice")["Count"]
-    order_count = fetch_one("SELECT COUNT(*) AS Count FROM Orders")["Count"]
+    # Hot tables plus the ArchiveDaily totals of everything already archived. Expired
+    # (abandoned) checkouts never sold anything; only Completed invoices get archived.
+    totals = fetch_one("""
+        SELECT (SELECT COALESCE(SUM(TotalAmount), 0) FROM Invoice WHERE Status <> 'Expired')
+                 + (SELECT COALESCE(SUM(TotalAmount), 0) FROM ArchiveDaily) AS Total,
+               (SELECT COUNT(*) FROM Invoice WHERE Status <> 'Expired')
+                 + (SELECT COALESCE(SUM(InvoiceCount), 0) FROM ArchiveDaily) AS Invoices,
+               (SELECT COUNT(*) FROM Orders o
+                JOIN Invoice i ON i.InvoiceID = o.InvoiceID AND i.Status <> 'Expired')
+                 + (SELECT COALESCE(SUM(OrderCount), 0) FROM ArchiveDaily) AS Orders
+    """)
+    total_sales = totals["Total"]
+    invoice_count = totals["Invoices"]
+    order_count = totals["Orders"]
     model_count = fetch_one("SELECT COUNT(*) AS Count FROM Model")["Count"]
 
-    profit_query = """
-        SELECT SUM(o.Amount - (m.Price * o.Quantity)) AS Profit
-        FROM Orders o
-        JOIN Item i ON o.ItemID = i.ItemID
-        JOIN Model m ON i.ModelID = m.ModelID
-    """
-    result = fetch_one(profit_query)
+    # Margins come from the pre-aggregated ItemSalesDaily buckets (completed sales,
+    # cost as captured at checkout) instead of re-joining every order line.
+    where = "WHERE 1=1"
+    params = []
+    if start_date:
+        where += " AND s.SaleDate >= %s"
+        params.append(start_date)
+    if end_date:
+        where += " AND s.SaleDate <= %s"
+        params.append(end_date)
+
+    result = fetch_one(f"""
+        SELECT SUM(s.Revenue) AS Revenue, SUM(s.Revenue - s.Cost) AS Profit
+        FROM ItemSalesDaily s
+        {where}
+    """, tuple(params))
     total_profit = result["Profit"] if result and result["Profit"] else 0
+    completed_revenue = result["Revenue"] if result and result["Revenue"] else 0
+
+    model_margins = fetch_all(f"""
+        SELECT s.ModelID, m.Name,
+               SUM(s.Quantity) AS Quantity,
+               SUM(s.Revenue) AS Revenue,
+               SUM(s.Revenue - s.Cost) AS Profit
+        FROM ItemSalesDaily s
+        JOIN Model m ON m.ModelID = s.ModelID
+        {where}
+        GROUP BY s.ModelID, m.Name
+        ORDER BY Profit DESC
+        LIMIT 20
+    """, tuple(params))
 
     return render_template(
         "admin_stats.html",
@@ -1075,58 +2650,73 @@ def admin_stats():
         total_invoices=invoice_count,
         total_orders=order_count,
         total_models=model_count,
-        total_profit=total_profit
+        total_profit=total_profit,
+        completed_revenue=completed_revenue,
+        model_margins=model_margins,
+        start_date=start_date,
+        end_date=end_date,
     )
 
 
+# Hot order lines (minus Expired checkouts) and archived per-day totals are summed per
+# model separately, then joined.
+ADMIN_SELLING_QUERY = QueryShape(
+    "admin_selling",
+    """
+    SELECT 
+        m.ModelID, 
+        m.Name, 
+        m.Item_Image, 
+        COALESCE(h.SoldCount, 0) + COALESCE(a.SoldCount, 0) as SoldCount,
+        GREATEST(COALESCE(h.LastSoldDate, a.LastSoldDate),
+                 COALESCE(a.LastSoldDate, h.LastSoldDate)) as LastSoldDate
+    FROM Model m
+    LEFT JOIN (
+        SELECT i.ModelID, SUM(o.Quantity) AS SoldCount, MAX(inv.Date) AS LastSoldDate
+        FROM Orders o
+        JOIN Item i ON i.ItemID = o.ItemID
+        JOIN Invoice inv ON inv.InvoiceID = o.InvoiceID
+        WHERE inv.Status <> 'Expired'
+          AND (%(start_date)s IS NULL OR inv.Date >= %(start_date)s OR inv.Date IS NULL)
+          AND (%(end_date)s IS NULL OR inv.Date <= %(end_date)s OR inv.Date IS NULL)
+        GROUP BY i.ModelID
+    ) h ON h.ModelID = m.ModelID
+    LEFT JOIN (
+        SELECT a.ModelID, SUM(a.Quantity) AS SoldCount, MAX(a.SaleDate) AS LastSoldDate
+        FROM ArchiveModelDaily a
+        WHERE (%(start_date)s IS NULL OR a.SaleDate >= %(start_date)s)
+          AND (%(end_date)s IS NULL OR a.SaleDate <= %(end_date)s)
+        GROUP BY a.ModelID
+    ) a ON a.ModelID = m.ModelID
+    WHERE (%(search)s IS NULL OR m.Name LIKE %(search)s)
+    """,
+    orders={
+        "quantity_desc": "SoldCount DESC",
+        "quantity_asc": "SoldCount ASC",
+        "date_desc": "LastSoldDate DESC",
+        "date_asc": "LastSoldDate ASC",
+    },
+    default_order="quantity_desc",
+)
+
+
 @app.route("/admin/selling")
 @role_required("Admin")
+@replica_reads
 def admin_selling():
     search = request.args.get("search", "")
     sort_by = request.args.get("sort_by", "quantity_desc")
     start_date = request.args.get("start_date", "")
     end_date = request.args.get("end_date", "")
 
-    sql = """
-        SELECT 
-            m.ModelID, 
-            m.Name, 
-            m.Item_Image, 
-            COALESCE(SUM(o.Quantity), 0) as SoldCount,
-            MAX(inv.Date) as LastSoldDate
-        FROM Model m
-        LEFT JOIN Item i ON m.ModelID = i.ModelID
-        LEFT JOIN Orders o ON i.ItemID = o.ItemID
-        LEFT JOIN Invoice inv ON o.InvoiceID = inv.InvoiceID
-        WHERE 1=1 
-    """
-
-    params = []
-
-    if search:
-        sql += " AND m.Name LIKE %s"
-        params.append(f"%{search}%")
-
-    if start_date:
-        sql += " AND (inv.Date >= %s OR inv.Date IS NULL)"
-        params.append(start_date)
-
-    if end_date:
-        sql += " AND (inv.Date <= %s OR inv.Date IS NULL)"
-        params.append(end_date)
-
-    sql += " GROUP BY m.ModelID "
-
-    if sort_by == "quantity_desc":
-        sql += " ORDER BY SoldCount DESC"
-    elif sort_by == "quantity_asc":
-        sql += " ORDER BY SoldCount ASC"
-    elif sort_by == "date_desc":
-        sql += " ORDER BY LastSoldDate DESC"
-    elif sort_by == "date_asc":
-        sql += " ORDER BY LastSoldDate ASC"
-
-    models = fetch_all(sql, tuple(params))
+    models = ADMIN_SELLING_QUERY.fetch_all(
+        {
+            "search": f"%{search}%" if search else None,
+            "start_date": start_date or None,
+            "end_date": end_date or None,
+        },
+        order=sort_by,
+    )
 
     return render_template(
         "admin_selling.html",
@@ -1138,56 +2728,77 @@ def admin_selling():
     )
 
 
-@app.route("/admin/employees")
-@role_required("Admin")
-def admin_employees():
-    positions = fetch_all("SELECT DISTINCT Position FROM Employee WHERE Position IS NOT NULL AND Position != ''")
-    places = fetch_all("SELECT PlaceID, Location, Type FROM Place")
-
-    sql = """
-        SELECT u.UserID, u.Name, u.Email, e.Position, e.Salary, 
-               p.Location AS PlaceName, p.Type AS PlaceType
-        FROM Employee e
-        JOIN User u ON e.UserID = u.UserID
-        LEFT JOIN Place p ON e.PlaceID = p.PlaceID
-        WHERE 1=1
+ADMIN_EMPLOYEES_PAGE_SIZE = 25
+# ?sort= value -> ORDER BY column; UserID breaks ties so pages don't overlap.
+EMPLOYEE_SORTS = {
+    "id": "u.UserID",
+    "name": "u.Name",
+    "place": "p.Location",
+    "position": "e.Position",
+    "salary": "e.Salary",
+}
+# The name filter is a prefix match, so idx_user_name can serve it (a leading % rules out
+# any index); place, position and salary range are the columns of idx_employee_place_position_salary.
+ADMIN_EMPLOYEES_QUERY = QueryShape(
+    "admin_employees",
     """
-    params = []
-
-    name_search = request.args.get("name", "").strip()
-    if name_search:
-        sql += " AND u.Name LIKE %s"
-        params.append(f"%{name_search}%")
-
-    pos_search = request.args.get("position", "").strip()
-    if pos_search:
-        sql += " AND e.Position = %s"
-        params.append(pos_search)
-
-    place_search = request.args.get("place", "").strip()
-    if place_search:
-        sql += " AND e.PlaceID = %s"
-        params.append(place_search)
-
-    min_sal = request.args.get("min_salary", "").strip()
-    if min_sal:
-        sql += " AND e.Salary >= %s"
-        params.append(min_sal)
-
-    max_sal = request.args.get("max_salary", "").strip()
-    if max_sal:
-        sql += " AND e.Salary <= %s"
-        params.append(max_sal)
+    SELECT u.UserID, u.Name, u.Email, e.Position, e.Salary, 
+           p.Location AS PlaceName, p.Type AS PlaceType
+    FROM Employee e
+    JOIN User u ON e.UserID = u.UserID
+    LEFT JOIN Place p ON e.PlaceID = p.PlaceID
+    WHERE (%(name)s IS NULL OR u.Name LIKE %(name)s)
+      AND (%(place)s IS NULL OR e.PlaceID = %(place)s)
+      AND (%(position)s IS NULL OR e.Position = %(position)s)
+      AND (%(min_salary)s IS NULL OR e.Salary >= %(min_salary)s)
+      AND (%(max_salary)s IS NULL OR e.Salary <= %(max_salary)s)
+    """,
+    orders={
+        f"{key}_{d}": f"{col} {d.upper()}, u.UserID {d.upper()}"
+        for key, col in EMPLOYEE_SORTS.items() for d in ("asc", "desc")
+    },
+    default_order="id_desc",
+)
 
-    sql += " ORDER BY u.UserID DESC"
 
-    employees = fetch_all(sql, tuple(params))
+@app.route("/admin/employees")
+@role_required("Admin")
+def admin_employees():
+    positions = cached_positions()
+    places = cached_places()
+
+    filters = {k: request.args.get(k, "").strip() for k in ("name", "position", "place", "min_salary", "max_salary")}
+    sort = request.args.get("sort", "id")
+    if sort not in EMPLOYEE_SORTS:
+        sort = "id"
+    direction = "asc" if request.args.get("dir") == "asc" else "desc"
+    page = max(request.args.get("page", type=int) or 1, 1)
+
+    employees = ADMIN_EMPLOYEES_QUERY.fetch_all(
+        {
+            "name": f"{filters['name']}%" if filters["name"] else None,
+            "place": filters["place"] or None,
+            "position": filters["position"] or None,
+            "min_salary": filters["min_salary"] or None,
+            "max_salary": filters["max_salary"] or None,
+        },
+        order=f"{sort}_{direction}",
+        limit=ADMIN_EMPLOYEES_PAGE_SIZE + 1,
+        offset=(page - 1) * ADMIN_EMPLOYEES_PAGE_SIZE,
+    )
+    has_next = len(employees) > ADMIN_EMPLOYEES_PAGE_SIZE
+    employees = employees[:ADMIN_EMPLOYEES_PAGE_SIZE]
 
     return render_template(
         "admin_employees.html",
         employees=employees,
         positions=positions,
-        places=places
+        places=places,
+        filters={k: v for k, v in filters.items() if v},
+        sort=sort,
+        direction=direction,
+        page=page,
+        has_next=has_next,
     )
 
 
@@ -1224,6 +2835,7 @@ def admin_create_employee():
         )
 
         mysql.connection.commit()
+        reference_cache.invalidate("positions")
         flash("Employee account created.", "success")
         return redirect(url_for("admin_employees"))
 
@@ -1236,8 +2848,9 @@ def admin_create_employee():
 
 @app.route("/admin/supply_orders")
 @role_required("Admin")
+@replica_reads
 def admin_supply_orders():
-    orders = fetch_all("""
+    orders = stream_rows("""
         SELECT so.SupplyOrderID, so.Date, so.TotalAmount, so.Status,
                s.Name AS SupplierName,
                p.Location AS PlaceLocation,
@@ -1247,23 +2860,44 @@ def admin_supply_orders():
         JOIN Place p ON p.PlaceID = so.PlaceID
         ORDER BY so.SupplyOrderID DESC
     """)
-    return render_template("admin_supply_orders.html", orders=orders)
+    return stream_listing("admin_supply_orders.html", orders=orders)
+
+
+def insert_supply_order(cur, supplier_id: int, place_id: int, created_by: int,
+                        date_str: str, lines: list[tuple[int, int, Decimal]]) -> int:
+    """Create a Pending supply order with two statements, whatever the line count.
+
+    The header carries its final TotalAmount from the start and all lines go in
+    with one multi-row INSERT.
+    """
+    total = sum((money(c) * q for _, q, c in lines), Decimal("0.00"))
+    cur.execute("""
+        INSERT INTO SupplyOrder (
+            SupplierID, PlaceID, CreatedByUserID,
+            DeliveredBySupplierID,
+            TotalAmount, Date, Status
+        )
+        VALUES (%s, %s, %s, NULL, %s, %s, 'Pending')
+    """, (supplier_id, place_id, created_by, total, date_str))
+    so_id = cur.lastrowid
+
+    params = []
+    for item_id, q, c in lines:
+        params.extend((so_id, item_id, q, money(c), money(c) * q))
+    cur.execute(f"""
+        INSERT INTO SupplyOrderLine (SupplyOrderID, ItemID, Quantity, UnitCost, Amount)
+        VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(lines))}
+    """, tuple(params))
+    return so_id
 
 
 @app.route("/admin/supply_orders/new", methods=["GET", "POST"])
 @role_required("Admin")
 def admin_supply_orders_new():
-    suppliers = fetch_all("SELECT * FROM Supplier ORDER BY Name ASC")
-    places = fetch_all("SELECT * FROM Place ORDER BY PlaceID ASC")
-    items = fetch_all("""
-        SELECT it.ItemID, it.Size, it.Color, m.Name AS ModelName
-        FROM Item it
-        JOIN Model m ON m.ModelID = it.ModelID
-        ORDER BY it.ItemID DESC
-    """)
-
     if request.method == "GET":
-        return render_template("admin_supply_order_form.html", suppliers=suppliers, places=places, items=items)
+        suppliers = cached_suppliers()
+        places = cached_places()
+        return render_template("admin_supply_order_form.html", suppliers=suppliers, places=places)
 
     supplier_id = request.form.get("SupplierID", type=int)
     place_id = request.form.get("PlaceID", type=int)
@@ -1282,7 +2916,7 @@ def admin_supply_orders_new():
         try:
             item_id = int(item_ids[i])
             q = int(qtys[i])
-            c = float(costs[i])
+            c = Decimal(costs[i])
             if q <= 0 or c < 0:
                 continue
             lines.append((item_id, q, c))
@@ -1295,28 +2929,7 @@ def admin_supply_orders_new():
 
     try:
         cur = mysql.connection.cursor()
-
-        cur.execute("""
-            INSERT INTO SupplyOrder (
-                SupplierID, PlaceID, CreatedByUserID,
-                DeliveredBySupplierID,
-                TotalAmount, Date, Status
-            )
-            VALUES (%s, %s, %s, NULL, 0, %s, 'Pending')
-        """, (supplier_id, place_id, session["user_id"], date_str))
-        so_id = cur.lastrowid
-
-        total = 0.0
-        for item_id, q, c in lines:
-            amount = q * c
-            total += amount
-            cur.execute("""
-                INSERT INTO SupplyOrderLine (SupplyOrderID, ItemID, Quantity, UnitCost, Amount)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (so_id, item_id, q, c, amount))
-
-        cur.execute("UPDATE SupplyOrder SET TotalAmount=%s WHERE SupplyOrderID=%s", (total, so_id))
-
+        so_id = insert_supply_order(cur, supplier_id, place_id, session["user_id"], date_str, lines)
         mysql.connection.commit()
         cur.close()
 
@@ -1329,6 +2942,326 @@ def admin_supply_orders_new():
         return redirect(url_for("admin_supply_orders_new"))
 
 
+@app.route("/admin/items/search")
+@role_required("Admin")
+def admin_items_search():
+    """Item picker for the supply order form: ?q=<ItemID or model name>&after=<ItemID>."""
+    q = (request.args.get("q") or "").strip()
+    after = request.args.get("after", type=int)
+    limit = max(1, min(request.args.get("limit", type=int) or 20, 100))
+
+    sql = """
+        SELECT it.ItemID, it.Size, it.Color, m.Name AS ModelName, m.ModelNumber, m.Price
+        FROM Item it
+        JOIN Model m ON m.ModelID = it.ModelID
+        WHERE 1=1
+    """
+    params = []
+    if q.isdigit():
+        sql += " AND it.ItemID = %s"
+        params.append(int(q))
+    elif q:
+        sql += " AND (m.Name LIKE %s OR m.ModelNumber LIKE %s)"
+        params.extend([f"{q}%", f"{q}%"])
+    if after:
+        sql += " AND it.ItemID < %s"
+        params.append(after)
+    sql += " ORDER BY it.ItemID DESC LIMIT %s"
+    params.append(limit + 1)
+
+    rows = fetch_all(sql, tuple(params))
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_after = rows[-1]["ItemID"]
+
+    return jsonify(
+        items=[
+            {
+                "ItemID": r["ItemID"],
+                "label": f"#{r['ItemID']} · {r['ModelName']} ({r['Size']} / {r['Color']})",
+                "UnitCost": str(r["Price"] or "0.00"),
+            }
+            for r in rows
+        ],
+        next_after=next_after,
+    )
+
+
+# Checkout reserves and completion ships from the store, so ItemSalesDaily only
+# describes its sales; replenishing any other place from them would be wrong.
+SELLING_PLACE_ID = 1
+
+
+def plan_replenishment(window_days: int, lead_days: int, cover_days: int) -> list[dict]:
+    """Propose supply order lines for the selling place, grouped by the model's supplier.
+
+    One query pulls every item with its sellable stock, inbound (Pending supply
+    orders) and sales over the window from ItemSalesDaily; the projection is then
+    plain arithmetic per row. An item is proposed when its projected stock runs
+    out before a new order could arrive (lead_days), and the proposal tops it up
+    to cover lead_days + cover_days of sales.
+    """
+    window_days = max(1, window_days)
+    lead_days = max(0, lead_days)
+    cover_days = max(0, cover_days)
+    rows = fetch_all("""
+        SELECT it.ItemID, it.Size, it.Color,
+               m.ModelID, m.Name AS ModelName, m.Price, m.SupplierID,
+               sup.Name AS SupplierName,
+               GREATEST(COALESCE(inv.Quantity, 0) - COALESCE(inv.ReservedQuantity, 0), 0) AS Available,
+               COALESCE(s.Sold, 0) AS Sold,
+               COALESCE(p.Inbound, 0) AS Inbound
+        FROM Item it
+        JOIN Model m ON m.ModelID = it.ModelID
+        JOIN Supplier sup ON sup.SupplierID = m.SupplierID
+        LEFT JOIN Inventory inv ON inv.ItemID = it.ItemID AND inv.PlaceID = %s
+        LEFT JOIN (
+            SELECT ItemID, SUM(Quantity) AS Sold
+            FROM ItemSalesDaily
+            WHERE SaleDate >= CURDATE() - INTERVAL %s DAY
+            GROUP BY ItemID
+        ) s ON s.ItemID = it.ItemID
+        LEFT JOIN (
+            SELECT sol.ItemID, SUM(sol.Quantity) AS Inbound
+            FROM SupplyOrder so
+            JOIN SupplyOrderLine sol ON sol.SupplyOrderID = so.SupplyOrderID
+            WHERE so.PlaceID = %s AND so.Status = 'Pending'
+            GROUP BY sol.ItemID
+        ) p ON p.ItemID = it.ItemID
+        ORDER BY m.SupplierID, it.ItemID
+    """, (SELLING_PLACE_ID, window_days, SELLING_PLACE_ID))
+
+    suppliers: dict[int, dict] = {}
+    for r in rows:
+        velocity = int(r["Sold"]) / window_days
+        if velocity <= 0:
+            continue
+        on_hand = int(r["Available"]) + int(r["Inbound"])
+        days_left = on_hand / velocity
+        if days_left >= lead_days:
+            continue
+        qty = math.ceil(velocity * (lead_days + cover_days)) - on_hand
+        if qty <= 0:
+            continue
+
+        group = suppliers.setdefault(r["SupplierID"], {
+            "SupplierID": r["SupplierID"],
+            "SupplierName": r["SupplierName"],
+            "lines": [],
+            "total": Decimal("0.00"),
+        })
+        unit_cost = money(r["Price"])
+        group["lines"].append({
+            **r,
+            "Velocity": round(velocity, 2),
+            "DaysLeft": round(days_left, 1),
+            "Quantity": qty,
+            "UnitCost": unit_cost,
+        })
+        group["total"] += unit_cost * qty
+
+    return list(suppliers.values())
+
+
+@app.cli.command("rebuild-sales-buckets")
+def rebuild_sales_buckets_command():
+    """Recompute ItemSalesDaily from all Completed invoices."""
+    cur = mysql.connection.cursor()
+    cur.execute("DELETE FROM ItemSalesDaily")
+    cur.execute(f"""
+        INSERT INTO ItemSalesDaily (SaleDate, ItemID, ModelID, Quantity, Revenue, Cost)
+        {SALES_BUCKET_SELECT.format(where="i.Status = 'Completed'")}
+    """)
+    # Archived invoices are all Completed; their lines still count.
+    cur.execute("""
+        INSERT INTO ItemSalesDaily (SaleDate, ItemID, ModelID, Quantity, Revenue, Cost)
+        SELECT * FROM (
+            SELECT a.SaleDate, a.ItemID, it.ModelID,
+                   SUM(a.Quantity) AS Qty,
+                   SUM(a.Amount) AS Revenue,
+                   SUM(COALESCE(a.UnitCost, m.Price, 0) * a.Quantity) AS Cost
+            FROM OrdersArchive a
+            JOIN Item it ON it.ItemID = a.ItemID
+            JOIN Model m ON m.ModelID = it.ModelID
+            GROUP BY a.SaleDate, a.ItemID, it.ModelID
+        ) AS s
+        ON DUPLICATE KEY UPDATE Quantity = ItemSalesDaily.Quantity + s.Qty,
+                                Revenue = ItemSalesDaily.Revenue + s.Revenue,
+                                Cost = ItemSalesDaily.Cost + s.Cost
+    """)
+    mysql.connection.commit()
+    count = fetch_one("SELECT COUNT(*) AS Count FROM ItemSalesDaily")["Count"]
+    click.echo(f"Rebuilt {count} sales bucket(s).")
+    cur.close()
+
+
+# Statements that copy a batch into the archive tables, with how many times each binds
+# the batch's InvoiceIDs. archive_invoices() runs them in order; check-archive-sql EXPLAINs them.
+ARCHIVE_COPY_STATEMENTS = (
+    ("""
+        INSERT INTO InvoiceArchive (InvoiceID, CustomerID, EmployeeID, TotalAmount, Date, Status,
+                                    LineCount, FirstItemName, Thumbnail)
+        SELECT InvoiceID, CustomerID, EmployeeID, TotalAmount, Date, Status,
+               LineCount, FirstItemName, Thumbnail
+        FROM Invoice
+        WHERE InvoiceID IN ({in_ids})
+    """, 1),
+    ("""
+        INSERT INTO OrdersArchive (OrderID, InvoiceID, SaleDate, ItemID, Quantity, Amount, UnitCost)
+        SELECT o.OrderID, o.InvoiceID, i.Date, o.ItemID, o.Quantity, o.Amount, o.UnitCost
+        FROM Orders o
+        JOIN Invoice i ON i.InvoiceID = o.InvoiceID
+        WHERE o.InvoiceID IN ({in_ids})
+    """, 1),
+    ("""
+        INSERT INTO ArchiveDaily (SaleDate, InvoiceCount, OrderCount, TotalAmount)
+        SELECT * FROM (
+            SELECT i.Date AS SaleDate, COUNT(*) AS Invoices,
+                   COALESCE(SUM(oc.LineCount), 0) AS LineCount, SUM(i.TotalAmount) AS Amount
+            FROM Invoice i
+            LEFT JOIN (
+                SELECT InvoiceID, COUNT(*) AS LineCount FROM Orders
+                WHERE InvoiceID IN ({in_ids})
+                GROUP BY InvoiceID
+            ) oc ON oc.InvoiceID = i.InvoiceID
+            WHERE i.InvoiceID IN ({in_ids})
+            GROUP BY i.Date
+        ) AS d
+        ON DUPLICATE KEY UPDATE InvoiceCount = ArchiveDaily.InvoiceCount + d.Invoices,
+                                OrderCount = ArchiveDaily.OrderCount + d.LineCount,
+                                TotalAmount = ArchiveDaily.TotalAmount + d.Amount
+    """, 2),
+    ("""
+        INSERT INTO ArchiveModelDaily (SaleDate, ModelID, Quantity)
+        SELECT * FROM (
+            SELECT i.Date AS SaleDate, it.ModelID, SUM(o.Quantity) AS Qty
+            FROM Orders o
+            JOIN Invoice i ON i.InvoiceID = o.InvoiceID
+            JOIN Item it ON it.ItemID = o.ItemID
+            WHERE o.InvoiceID IN ({in_ids})
+            GROUP BY i.Date, it.ModelID
+        ) AS d
+        ON DUPLICATE KEY UPDATE Quantity = ArchiveModelDaily.Quantity + d.Qty
+    """, 1),
+)
+
+
+def archive_invoices(cutoff: date, batch_size: int) -> int:
+    """Move one batch of Completed invoices dated before `cutoff` into the archive.
+
+    Invoice rows, their Orders and the ArchiveDaily/ArchiveModelDaily totals are
+    written, and the hot rows (plus released Reservation rows) deleted, in one
+    transaction. Returns the number of invoices moved.
+    """
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("""
+            SELECT InvoiceID FROM Invoice
+            WHERE Status = 'Completed' AND Date < %s
+            ORDER BY InvoiceID
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (cutoff, batch_size))
+        ids = tuple(r["InvoiceID"] for r in cur.fetchall())
+        if not ids:
+            mysql.connection.commit()
+            return 0
+        in_ids = sql_in(ids)
+
+        for statement, id_lists in ARCHIVE_COPY_STATEMENTS:
+            cur.execute(statement.format(in_ids=in_ids), ids * id_lists)
+
+        cur.execute(f"DELETE FROM Reservation WHERE InvoiceID IN ({in_ids})", ids)
+        cur.execute(f"DELETE FROM Orders WHERE InvoiceID IN ({in_ids})", ids)
+        cur.execute(f"DELETE FROM Invoice WHERE InvoiceID IN ({in_ids})", ids)
+        mysql.connection.commit()
+        return len(ids)
+    except Exception:
+        mysql.connection.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+@app.cli.command("archive-invoices")
+@click.option("--days", type=int, default=None, help="Archive Completed invoices older than this (default ARCHIVE_AFTER_DAYS).")
+@click.option("--batch", type=int, default=None, help="Invoices per transaction (default ARCHIVE_BATCH).")
+def archive_invoices_command(days, batch):
+    """Move old Completed invoices and their lines into the partitioned archive tables."""
+    days = days if days is not None else app.config["ARCHIVE_AFTER_DAYS"]
+    batch = batch or app.config["ARCHIVE_BATCH"]
+    cutoff = date.today() - timedelta(days=days)
+    started = time.perf_counter()
+    total = 0
+    while True:
+        moved = archive_invoices(cutoff, batch)
+        total += moved
+        if moved < batch:
+            break
+    click.echo(f"Archived {total} invoice(s) dated before {cutoff} in {time.perf_counter() - started:.2f}s.")
+
+
+@app.cli.command("check-archive-sql")
+def check_archive_sql_command():
+    """EXPLAIN each archive statement so the server parses it, without archiving anything."""
+    cur = mysql.connection.cursor()
+    try:
+        for statement, id_lists in ARCHIVE_COPY_STATEMENTS:
+            cur.execute("EXPLAIN " + statement.format(in_ids="%s"), (0,) * id_lists)
+            cur.fetchall()
+    finally:
+        mysql.connection.rollback()
+        cur.close()
+    click.echo(f"{len(ARCHIVE_COPY_STATEMENTS)} archive statement(s) OK.")
+
+
+@app.cli.command("plan-replenishment")
+def plan_replenishment_command():
+    """Print the supply orders the replenishment planner would propose for the store."""
+    started = time.perf_counter()
+    plan = plan_replenishment(
+        app.config["REPLENISH_WINDOW_DAYS"],
+        app.config["REPLENISH_LEAD_DAYS"],
+        app.config["REPLENISH_COVER_DAYS"],
+    )
+    for group in plan:
+        click.echo(f"{group['SupplierName']}: {len(group['lines'])} line(s), ${group['total']}")
+        for ln in group["lines"]:
+            click.echo(f"  Item #{ln['ItemID']} {ln['ModelName']} ({ln['Size']}/{ln['Color']}): "
+                       f"{ln['Quantity']} @ ${ln['UnitCost']}  [{ln['DaysLeft']} days left]")
+    click.echo(f"Planned in {time.perf_counter() - started:.2f}s.")
+
+
+@app.route("/admin/replenishment")
+@role_required("Admin")
+def admin_replenishment():
+    place_id = SELLING_PLACE_ID
+
+    def days_arg(name: str, config_key: str, minimum: int) -> int:
+        # 0 is a real answer for lead/cover, so only a missing value falls back.
+        value = request.args.get(name, type=int)
+        return max(minimum, app.config[config_key] if value is None else value)
+
+    window_days = days_arg("window", "REPLENISH_WINDOW_DAYS", 1)
+    lead_days = days_arg("lead", "REPLENISH_LEAD_DAYS", 0)
+    cover_days = days_arg("cover", "REPLENISH_COVER_DAYS", 0)
+
+    plan = plan_replenishment(window_days, lead_days, cover_days)
+    place = next((p for p in cached_places() if p["PlaceID"] == place_id), None)
+
+    return render_template(
+        "admin_replenishment.html",
+        plan=plan,
+        place=place,
+        place_id=place_id,
+        window=window_days,
+        lead=lead_days,
+        cover=cover_days,
+        today=date.today().isoformat(),
+    )
+
+
 @app.route("/admin/supply_orders/<int:so_id>")
 @role_required("Admin")
 def admin_supply_order_view(so_id: int):
@@ -1384,40 +3317,80 @@ def admin_supply_order_cancel(so_id: int):
 
 
 
+SUPPLIER_ORDERS_PAGE_SIZE = 25
+
+
 @app.route("/supplier/supply_orders")
 @role_required("Supplier")
 def supplier_supply_orders():
-    supplier_user_id = session["user_id"]
-
-    supplier = fetch_one("SELECT SupplierID FROM Supplier WHERE UserID=%s", (supplier_user_id,))
-    if not supplier:
+    """Keyset-paginated portal list (?before=<SupplyOrderID>) with status/date filters."""
+    supplier_id = get_current_supplier_id()
+    if not supplier_id:
         abort(403)
 
-    supplier_id = supplier["SupplierID"]
+    status = request.args.get("status", "")
+    date_from = request.args.get("date_from", "")
+    date_to = request.args.get("date_to", "")
+    before = request.args.get("before", type=int)
+
+    summary = fetch_one("""
+        SELECT COUNT(*) AS TotalCount,
+               COALESCE(SUM(Status = 'Pending'), 0) AS OpenCount,
+               COALESCE(SUM(CASE WHEN Status = 'Pending' THEN TotalAmount END), 0) AS OpenValue
+        FROM SupplyOrder
+        WHERE SupplierID = %s
+    """, (supplier_id,))
 
-    orders = fetch_all("""
+    sql = """
         SELECT so.SupplyOrderID, so.Date, so.TotalAmount, so.Status,
                p.Location AS PlaceLocation
         FROM SupplyOrder so
         JOIN Place p ON p.PlaceID = so.PlaceID
         WHERE so.SupplierID = %s
-        ORDER BY so.SupplyOrderID DESC
-    """, (supplier_id,))
+    """
+    params = [supplier_id]
+
+    if status in ("Pending", "Delivered", "Cancelled"):
+        sql += " AND so.Status = %s"
+        params.append(status)
+    if date_from:
+        sql += " AND so.Date >= %s"
+        params.append(date_from)
+    if date_to:
+        sql += " AND so.Date <= %s"
+        params.append(date_to)
+    if before:
+        sql += " AND so.SupplyOrderID < %s"
+        params.append(before)
+
+    sql += " ORDER BY so.SupplyOrderID DESC LIMIT %s"
+    params.append(SUPPLIER_ORDERS_PAGE_SIZE + 1)
+
+    orders = fetch_all(sql, tuple(params))
+    next_before = None
+    if len(orders) > SUPPLIER_ORDERS_PAGE_SIZE:
+        orders = orders[:SUPPLIER_ORDERS_PAGE_SIZE]
+        next_before = orders[-1]["SupplyOrderID"]
 
-    return render_template("supplier_supply_orders.html", orders=orders)
+    return render_template(
+        "supplier_supply_orders.html",
+        orders=orders,
+        summary=summary,
+        status=status,
+        date_from=date_from,
+        date_to=date_to,
+        before=before,
+        next_before=next_before,
+    )
 
 
 @app.route("/supplier/supply_orders/<int:so_id>")
 @role_required("Supplier")
 def supplier_supply_order_view(so_id: int):
-    supplier_user_id = session["user_id"]
-
-    supplier = fetch_one("SELECT SupplierID FROM Supplier WHERE UserID=%s", (supplier_user_id,))
-    if not supplier:
+    supplier_id = get_current_supplier_id()
+    if not supplier_id:
         abort(403)
 
-    supplier_id = supplier["SupplierID"]
-
     so = fetch_one("""
         SELECT so.*, s.Name AS SupplierName, p.Location AS PlaceLocation
         FROM SupplyOrder so
@@ -1465,40 +3438,220 @@ def supplier_supply_order_deliver(so_id: int):
             flash("Only Pending supply orders can be delivered.", "warning")
             return redirect(url_for("supplier_supply_order_view", so_id=so_id))
 
-        cur.execute("""
-            SELECT ItemID, Quantity
-            FROM SupplyOrderLine
-            WHERE SupplyOrderID=%s
-        """, (so_id,))
-        lines = cur.fetchall()
+        # Received quantity per line (defaults to the ordered quantity), clamped to 0..ordered.
+        received = {}
+        for key, value in request.form.items():
+            if key.startswith("received_") and key[9:].isdigit():
+                try:
+                    received[int(key[9:])] = int(value)
+                except ValueError:
+                    continue
+
+        if received:
+            cases = " ".join(["WHEN %s THEN LEAST(GREATEST(%s, 0), Quantity)"] * len(received))
+            params = [v for pair in received.items() for v in pair]
+            cur.execute(f"""
+                UPDATE SupplyOrderLine
+                SET ReceivedQuantity = CASE SupplyOrderLineID {cases} ELSE Quantity END
+                WHERE SupplyOrderID=%s
+            """, (*params, so_id))
+        else:
+            cur.execute(
+                "UPDATE SupplyOrderLine SET ReceivedQuantity = Quantity WHERE SupplyOrderID=%s",
+                (so_id,)
+            )
 
-        for ln in lines:
-            cur.execute("""
-                INSERT INTO Inventory (PlaceID, ItemID, Quantity, ReservedQuantity)
-                VALUES (%s, %s, %s, 0)
-                ON DUPLICATE KEY UPDATE Quantity = Quantity + VALUES(Quantity)
-            """, (so["PlaceID"], ln["ItemID"], ln["Quantity"]))
+        # One upsert for the whole order; duplicate item lines are merged by the GROUP BY.
+        cur.execute("""
+            INSERT INTO Inventory (PlaceID, ItemID, Quantity, ReservedQuantity)
+            SELECT * FROM (
+                SELECT %s AS PlaceID, ItemID, SUM(ReceivedQuantity) AS Qty, 0 AS Reserved
+                FROM SupplyOrderLine
+                WHERE SupplyOrderID=%s
+                GROUP BY ItemID
+                HAVING Qty > 0
+            ) AS recv
+            ON DUPLICATE KEY UPDATE Quantity = Inventory.Quantity + recv.Qty
+        """, (so["PlaceID"], so_id))
+        cur.execute(
+            "SELECT ItemID, SUM(ReceivedQuantity) AS Qty FROM SupplyOrderLine WHERE SupplyOrderID=%s GROUP BY ItemID",
+            (so_id,)
+        )
+        stock_changed(so["PlaceID"], {r["ItemID"]: (int(r["Qty"]), 0) for r in cur.fetchall()}, cur)
 
         cur.execute("""
             UPDATE SupplyOrder
-            SET Status='Received',
+            SET Status='Delivered',
                 DeliveredBySupplierID=%s
             WHERE SupplyOrderID=%s
         """, (supplier_id, so_id))
 
-        mysql.connection.commit()
+        commit()
         cur.close()
 
         flash("Supply order received. Inventory updated.", "success")
         return redirect(url_for("supplier_supply_order_view", so_id=so_id))
 
     except Exception as e:
-        mysql.connection.rollback()
+        rollback()
         flash(f"Error delivering supply order: {e}", "error")
         return redirect(url_for("supplier_supply_order_view", so_id=so_id))
 
 
 
+def precompile_templates() -> int:
+    """Compile every template into jinja_env's cache (and the bytecode cache on disk)."""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+@app.cli.command("compile-templates")
+def compile_templates_command():
+    """Fill the template bytecode cache ahead of a deploy."""
+    started = time.perf_counter()
+    count = precompile_templates()
+    click.echo(f"Compiled {count} templates into {JINJA_CACHE_DIR} in {time.perf_counter() - started:.3f}s.")
+
+
+def warm_up() -> dict[str, float]:
+    """Do the per-process start-up work before the first request arrives.
+
+    Under gunicorn's preload_app this runs once in the master, so every forked
+    worker starts with compiled templates, the schema probe done and the
+    facet/availability caches filled (copy-on-write). No DB connection is kept
+    open across the fork: the app context below closes it on exit.
+    Returns seconds spent per step.
+    """
+    timings = {}
+    started = time.perf_counter()
+    precompile_templates()
+    timings["templates"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            inv_status_sql_select()
+            facet_index.search({})
+            availability.get_many(())
+    except Exception as e:
+        app.logger.warning("Warm-up skipped DB caches: %s", e)
+    timings["db_caches"] = time.perf_counter() - started
+    return timings
+
+
+@app.cli.command("bench-startup")
+@click.option("--runs", default=3, show_default=True, help="Cold starts to measure.")
+def bench_startup_command(runs):
+    """Time a cold interpreter from import through warm-up to the first served request."""
+    import subprocess
+    import sys
+
+    probe = (
+        "import time; t0 = time.perf_counter()\n"
+        "import app as shop; t1 = time.perf_counter()\n"
+        "shop.warm_up(); t2 = time.perf_counter()\n"
+        "shop.app.test_client().get('/'); t3 = time.perf_counter()\n"
+        "print(f'{t1 - t0:.3f} {t2 - t1:.3f} {t3 - t2:.3f} {t3 - t0:.3f}')\n"
+    )
+    click.echo("import    warm_up   first_req total (seconds)")
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", probe], cwd=app.root_path,
+            capture_output=True, text=True, check=True,
+        ).stdout.split()[-4:]
+        click.echo("   ".join(f"{float(x):7.3f}" for x in out))
+
+
+@app.cli.command("bench-compression")
+@click.argument("paths", nargs=-1)
+@click.option("--role", default=None, help="Fetch as a logged-in Admin/Employee/Customer/Supplier.")
+@click.option("--user-id", default=1, show_default=True, type=int)
+def bench_compression_command(paths, role, user_id):
+    """Bytes on the wire and compression CPU per route, for each encoding."""
+    client = app.test_client()
+    if role:
+        with client.session_transaction() as sess:
+            sess["user_id"] = user_id
+            sess["role"] = role
+    click.echo(f"{'path':<32} {'status':>6} {'raw':>9} " + " ".join(
+        f"{enc:>9} {enc + ' ms':>8}" for enc in compression_encodings()))
+    for path in paths or ("/",):
+        raw = client.get(path, headers={"Accept-Encoding": "identity"})
+        data = raw.get_data()
+        cols = []
+        for enc in compression_encodings():
+            compress, _, finish = make_compressor(enc)
+            started = time.thread_time()
+            size = len(compress(data) + finish())
+            cols.append(f"{size:>9} {(time.thread_time() - started) * 1000:>8.2f}")
+        click.echo(f"{path:<32} {raw.status_code:>6} {len(data):>9} " + " ".join(cols))
+
+
+@app.cli.command("bench-checkout-token")
+@click.option("--customer-id", required=True, type=int, help="User ID of a Customer to check out as.")
+@click.option("--item-id", required=True, type=int, help="In-stock item to put in the cart.")
+@click.option("--requests", "n", default=5, show_default=True,
+              help="Parallel POSTs (beyond the checkout burst of 5 the extra ones get 429).")
+def bench_checkout_token_command(customer_id, item_id, n):
+    """Fire N parallel checkouts with one token; exactly one invoice must come out.
+
+    This places a real Pending order (released by the sweeper once it expires), so run
+    it against a development database.
+    """
+    row = fetch_one("""
+        SELECT i.ItemID, i.Size, i.Color, i.ModelID, m.Name, m.Sell_Price, m.Item_Image
+        FROM Item i
+        JOIN Model m ON m.ModelID = i.ModelID
+        WHERE i.ItemID = %s
+    """, (item_id,))
+    if not row:
+        raise click.BadParameter(f"no Item #{item_id}", param_hint="--item-id")
+    cart = {str(item_id): {
+        "qty": 1,
+        "model_id": int(row["ModelID"]),
+        "name": row["Name"],
+        "sell_price": str(row["Sell_Price"]),
+        "image": row["Item_Image"] or "default.png",
+        "size": row["Size"] or "",
+        "color": row["Color"] or "",
+    }}
+    last = fetch_one("SELECT COALESCE(MAX(InvoiceID), 0) AS InvoiceID FROM Invoice")["InvoiceID"]
+    token = uuid.uuid4().hex
+    start = threading.Barrier(n, timeout=30)
+    statuses: list[int] = []
+
+    def post():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["user_id"] = customer_id
+            sess["role"] = "Customer"
+            sess["cart"] = cart
+        start.wait()
+        statuses.append(client.post("/checkout", data={"checkout_token": token}).status_code)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=post) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    mysql.connection.commit()  # end the snapshot taken by the MAX() read above
+    invoices = fetch_all(
+        "SELECT InvoiceID FROM Invoice WHERE CustomerID=%s AND InvoiceID > %s", (customer_id, last)
+    )
+    tokens = fetch_one("SELECT COUNT(*) AS n, MAX(InvoiceID) AS InvoiceID FROM CheckoutToken WHERE Token=%s",
+                       (token,))
+    click.echo(f"{n} POST(s) in {elapsed:.2f}s, status counts: "
+               + ", ".join(f"{code}: {statuses.count(code)}" for code in sorted(set(statuses))))
+    click.echo(f"Invoices created: {[r['InvoiceID'] for r in invoices]}, token rows: {tokens['n']}")
+    if len(invoices) != 1 or tokens["n"] != 1 or tokens["InvoiceID"] != invoices[0]["InvoiceID"]:
+        raise click.ClickException("checkout token did not yield exactly one invoice")
+
+
 @app.errorhandler(403)
 def forbidden(_):
     return render_template("errors/403.html"), 403
@@ -1509,5 +3662,21 @@ def not_found(_):
     return render_template("errors/404.html"), 404
 
 
+def retry_after_headers(e) -> dict[str, str]:
+    return {"Retry-After": str(e.retry_after)} if getattr(e, "retry_after", None) else {}
+
+
+@app.errorhandler(429)
+def too_many_requests(e):
+    return render_template("errors/429.html"), 429, retry_after_headers(e)
+
+
+@app.errorhandler(503)
+def service_unavailable(e):
+    return render_template("errors/503.html"), 503, retry_after_headers(e)
+
+
 if __name__ == "__main__":
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_reservation_sweeper()
     app.run(debug=True)
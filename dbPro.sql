@@ -12,7 +12,8 @@ CREATE TABLE User (
   Address VARCHAR(200),
   Email VARCHAR(100) UNIQUE,
   Phone_Number VARCHAR(20),
-  Role ENUM('Customer','Employee','Admin','Supplier') NOT NULL DEFAULT 'Customer'
+  Role ENUM('Customer','Employee','Admin','Supplier') NOT NULL DEFAULT 'Customer',
+  INDEX idx_user_name (Name)
 );
 
 CREATE TABLE Customer (
@@ -35,6 +36,7 @@ CREATE TABLE Employee (
   Position VARCHAR(100),
   Salary DECIMAL(10,2),
   PlaceID INT,
+  INDEX idx_employee_place_position_salary (PlaceID, Position, Salary),
   FOREIGN KEY (UserID) REFERENCES User(UserID),
   FOREIGN KEY (PlaceID) REFERENCES Place(PlaceID)
 );
@@ -61,6 +63,8 @@ CREATE TABLE Model (
   Profit DECIMAL(10,2),
   Item_Image VARCHAR(200),
   SupplierID INT,
+  INDEX idx_model_name (Name),
+  INDEX idx_model_sell_price (Sell_Price),
   FOREIGN KEY (SupplierID) REFERENCES Supplier(SupplierID)
 );
 
@@ -69,6 +73,7 @@ CREATE TABLE Item (
   ModelID INT NOT NULL,
   Size VARCHAR(10),
   Color VARCHAR(30),
+  LowStockThreshold INT NOT NULL DEFAULT 5,
   FOREIGN KEY (ModelID) REFERENCES Model(ModelID)
 );
 
@@ -90,7 +95,13 @@ CREATE TABLE Invoice (
   EmployeeID INT NULL,
   TotalAmount DECIMAL(10,2) NOT NULL,
   Date DATE,
-  Status ENUM('Pending','Accepted','Prepared','Completed') DEFAULT 'Pending',
+  Status ENUM('Pending','Accepted','Prepared','Completed','Expired') DEFAULT 'Pending',
+  -- Summary captured at checkout so the history page needs no joins.
+  LineCount INT NOT NULL DEFAULT 0,
+  FirstItemName VARCHAR(150),
+  Thumbnail VARCHAR(200),
+  INDEX idx_invoice_status (Status, InvoiceID),
+  INDEX idx_invoice_customer (CustomerID, InvoiceID),
   FOREIGN KEY (CustomerID) REFERENCES Customer(UserID),
   FOREIGN KEY (EmployeeID) REFERENCES Employee(UserID)
 );
@@ -101,10 +112,142 @@ CREATE TABLE Orders (
   ItemID INT NOT NULL,
   Quantity INT NOT NULL,
   Amount DECIMAL(10,2) NOT NULL,
+  -- Model.Price at checkout time, so later cost edits don't rewrite history.
+  UnitCost DECIMAL(10,2) NULL,
   FOREIGN KEY (InvoiceID) REFERENCES Invoice(InvoiceID),
   FOREIGN KEY (ItemID) REFERENCES Item(ItemID)
 );
 
+-- Per-model stock per place (SUM over the model's items), kept current by
+-- every route that changes Inventory; admin_models sorts/filters on it.
+-- idx_modelstock_place_qty covers the per-place lookup (the PK leads with ModelID);
+-- it cannot serve the sort, which is on the summed quantity.
+CREATE TABLE ModelStock (
+  ModelID INT NOT NULL,
+  PlaceID INT NOT NULL,
+  Quantity INT NOT NULL DEFAULT 0,
+  ReservedQuantity INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (ModelID, PlaceID),
+  INDEX idx_modelstock_place_qty (PlaceID, Quantity),
+  FOREIGN KEY (ModelID) REFERENCES Model(ModelID),
+  FOREIGN KEY (PlaceID) REFERENCES Place(PlaceID)
+);
+
+-- Items whose sellable stock (Quantity - ReservedQuantity) is below their
+-- LowStockThreshold, kept current by every route that changes Inventory.
+CREATE TABLE LowStockItem (
+  PlaceID INT NOT NULL,
+  ItemID INT NOT NULL,
+  Available INT NOT NULL,
+  Threshold INT NOT NULL,
+  Since DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (PlaceID, ItemID),
+  INDEX idx_lowstock_since (Since)
+);
+
+-- Idempotency keys for checkout POSTs: a retried request with the same token
+-- finds the invoice created by the first one. Purged after a TTL.
+CREATE TABLE CheckoutToken (
+  Token CHAR(32) PRIMARY KEY,
+  CustomerID INT NOT NULL,
+  InvoiceID INT NULL,
+  CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_checkout_token_created (CreatedAt)
+);
+
+-- One row per reserved (invoice, item) so stale Pending invoices can be
+-- released by the sweeper without scanning Invoice/Orders.
+CREATE TABLE Reservation (
+  ReservationID INT AUTO_INCREMENT PRIMARY KEY,
+  InvoiceID INT NOT NULL,
+  PlaceID INT NOT NULL,
+  ItemID INT NOT NULL,
+  Quantity INT NOT NULL,
+  CreatedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  ExpiresAt DATETIME NOT NULL,
+  ReleasedAt DATETIME NULL,
+  INDEX idx_reservation_open (ReleasedAt, ExpiresAt),
+  INDEX idx_reservation_invoice (InvoiceID),
+  FOREIGN KEY (InvoiceID) REFERENCES Invoice(InvoiceID),
+  FOREIGN KEY (PlaceID, ItemID) REFERENCES Inventory(PlaceID, ItemID)
+);
+
+
+-- Completed sales per item per day (invoice date), fed by invoice completion.
+-- Also the margin store: Revenue/Cost use the amounts captured on Orders.
+CREATE TABLE ItemSalesDaily (
+  SaleDate DATE NOT NULL,
+  ItemID INT NOT NULL,
+  ModelID INT NOT NULL,
+  Quantity INT NOT NULL DEFAULT 0,
+  Revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+  Cost DECIMAL(12,2) NOT NULL DEFAULT 0,
+  PRIMARY KEY (SaleDate, ItemID),
+  INDEX idx_sales_item (ItemID, SaleDate),
+  INDEX idx_sales_model (SaleDate, ModelID),
+  FOREIGN KEY (ItemID) REFERENCES Item(ItemID)
+);
+
+-- Completed invoices older than ARCHIVE_AFTER_DAYS, moved here with their lines
+-- by `flask archive-invoices`. Partitioned by year (the date is part of every
+-- key, and partitioned InnoDB tables cannot have foreign keys).
+CREATE TABLE InvoiceArchive (
+  InvoiceID INT NOT NULL,
+  CustomerID INT NOT NULL,
+  EmployeeID INT NULL,
+  TotalAmount DECIMAL(10,2) NOT NULL,
+  Date DATE NOT NULL,
+  Status ENUM('Pending','Accepted','Prepared','Completed','Expired') NOT NULL,
+  LineCount INT NOT NULL DEFAULT 0,
+  FirstItemName VARCHAR(150),
+  Thumbnail VARCHAR(200),
+  ArchivedAt DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (InvoiceID, Date),
+  INDEX idx_invoice_archive_customer (CustomerID, InvoiceID)
+)
+PARTITION BY RANGE (YEAR(Date)) (
+  PARTITION p2024 VALUES LESS THAN (2025),
+  PARTITION p2025 VALUES LESS THAN (2026),
+  PARTITION p2026 VALUES LESS THAN (2027),
+  PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+CREATE TABLE OrdersArchive (
+  OrderID INT NOT NULL,
+  InvoiceID INT NOT NULL,
+  SaleDate DATE NOT NULL,
+  ItemID INT NOT NULL,
+  Quantity INT NOT NULL,
+  Amount DECIMAL(10,2) NOT NULL,
+  UnitCost DECIMAL(10,2) NULL,
+  PRIMARY KEY (OrderID, SaleDate),
+  INDEX idx_orders_archive_invoice (InvoiceID),
+  INDEX idx_orders_archive_item (ItemID, SaleDate)
+)
+PARTITION BY RANGE (YEAR(SaleDate)) (
+  PARTITION p2024 VALUES LESS THAN (2025),
+  PARTITION p2025 VALUES LESS THAN (2026),
+  PARTITION p2026 VALUES LESS THAN (2027),
+  PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- Totals of everything archived, so reports add them instead of scanning the archive.
+CREATE TABLE ArchiveDaily (
+  SaleDate DATE PRIMARY KEY,
+  InvoiceCount INT NOT NULL DEFAULT 0,
+  OrderCount INT NOT NULL DEFAULT 0,
+  TotalAmount DECIMAL(12,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE ArchiveModelDaily (
+  SaleDate DATE NOT NULL,
+  ModelID INT NOT NULL,
+  Quantity INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (SaleDate, ModelID),
+  INDEX idx_archive_model (ModelID, SaleDate),
+  FOREIGN KEY (ModelID) REFERENCES Model(ModelID)
+);
+
 
 CREATE TABLE SupplyOrder (
   SupplyOrderID INT AUTO_INCREMENT PRIMARY KEY,
@@ -115,6 +258,8 @@ CREATE TABLE SupplyOrder (
   TotalAmount DECIMAL(10,2) DEFAULT 0,
   Date DATE NOT NULL,
   Status ENUM('Pending','Delivered','Cancelled') DEFAULT 'Pending',
+  INDEX idx_so_place_status (PlaceID, Status),
+  INDEX idx_so_supplier_status (SupplierID, Status, SupplyOrderID),
   FOREIGN KEY (SupplierID) REFERENCES Supplier(SupplierID),
   FOREIGN KEY (PlaceID) REFERENCES Place(PlaceID),
   FOREIGN KEY (CreatedByUserID) REFERENCES User(UserID),
@@ -128,6 +273,8 @@ CREATE TABLE SupplyOrderLine (
   Quantity INT NOT NULL,
   UnitCost DECIMAL(10,2) NOT NULL,
   Amount DECIMAL(10,2) NOT NULL,
+  ReceivedQuantity INT NULL,
+  INDEX idx_sol_order_item (SupplyOrderID, ItemID),
   FOREIGN KEY (SupplyOrderID) REFERENCES SupplyOrder(SupplyOrderID),
   FOREIGN KEY (ItemID) REFERENCES Item(ItemID)
 );
@@ -165,24 +312,54 @@ INSERT INTO Item (ModelID, Size, Color) VALUES
 (2,'M','Red');
 
 INSERT INTO Inventory (PlaceID, ItemID, Quantity, ReservedQuantity) VALUES
-(1,1,10,0),
+(1,1,10,2),
 (1,2,5,0),
-(1,3,8,0),
-(1,4,4,0),
+(1,3,8,1),
+(1,4,4,1),
 (2,1,50,0),
 (2,2,50,0),
 (2,3,30,0),
 (2,4,30,0);
 
 
-INSERT INTO Invoice (CustomerID, EmployeeID, TotalAmount, Date, Status) VALUES
-(1,NULL,120.00,'2026-01-18','Pending'),
-(2,NULL,80.00,'2026-01-18','Pending');
-
-INSERT INTO Orders (InvoiceID, ItemID, Quantity, Amount) VALUES
-(1,1,2,80.00),
-(1,3,1,40.00),
-(2,4,1,80.00);
+INSERT INTO ModelStock (ModelID, PlaceID, Quantity, ReservedQuantity) VALUES
+(1,1,15,2),
+(2,1,12,2),
+(1,2,100,0),
+(2,2,60,0);
+
+INSERT INTO LowStockItem (PlaceID, ItemID, Available, Threshold) VALUES
+(1,4,3,5);
+
+INSERT INTO Invoice (CustomerID, EmployeeID, TotalAmount, Date, Status, LineCount, FirstItemName, Thumbnail) VALUES
+(1,NULL,120.00,'2026-01-18','Pending',2,'Blue Shirt (M / Blue)','blue_shirt.png'),
+(2,NULL,80.00,'2026-01-18','Pending',1,'Red Dress (M / Red)','red_dress.png');
+
+INSERT INTO Orders (InvoiceID, ItemID, Quantity, Amount, UnitCost) VALUES
+(1,1,2,80.00,25.00),
+(1,3,1,40.00,50.00),
+(2,4,1,80.00,50.00);
+
+-- Backfill the history summary (LineCount, FirstItemName, Thumbnail) for invoices created
+-- before those columns existed; also available as `flask backfill-invoice-summaries`.
+UPDATE Invoice i
+JOIN (
+  SELECT InvoiceID, COUNT(*) AS LineTotal, MIN(OrderID) AS FirstOrderID
+  FROM Orders
+  GROUP BY InvoiceID
+) s ON s.InvoiceID = i.InvoiceID
+JOIN Orders fo ON fo.OrderID = s.FirstOrderID
+JOIN Item it ON it.ItemID = fo.ItemID
+JOIN Model m ON m.ModelID = it.ModelID
+SET i.LineCount = s.LineTotal,
+    i.FirstItemName = LEFT(CONCAT(m.Name, ' (', COALESCE(it.Size, '-'), ' / ', COALESCE(it.Color, '-'), ')'), 150),
+    i.Thumbnail = COALESCE(m.Item_Image, 'default.png')
+WHERE i.LineCount = 0;
+
+INSERT INTO Reservation (InvoiceID, PlaceID, ItemID, Quantity, CreatedAt, ExpiresAt) VALUES
+(1,1,1,2,'2026-01-18 10:00:00','2026-01-20 10:00:00'),
+(1,1,3,1,'2026-01-18 10:00:00','2026-01-20 10:00:00'),
+(2,1,4,1,'2026-01-18 11:00:00','2026-01-20 11:00:00');
 
 INSERT INTO SupplyOrder (SupplierID, PlaceID, CreatedByUserID, DeliveredBySupplierID, TotalAmount, Date, Status)
 VALUES (1, 2, 3, NULL, 0, '2026-01-18', 'Pending');
@@ -0,0 +1,50 @@
+"""Gunicorn production profile for the shop (see README "Production").
+
+preload_app imports wsgi.py (and runs app.warm_up()) once in the master, so
+workers fork with templates compiled and caches filled. gthread workers suit
+this I/O-bound app: each request mostly waits on MySQL.
+"""
+import multiprocessing
+import os
+import time
+
+BOOT_STARTED = time.time()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+preload_app = True
+worker_class = "gthread"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+
+# Recycle workers gracefully to cap memory growth; jitter avoids all of them restarting together.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
+
+_first_request_logged = False
+
+
+def when_ready(server):
+    server.log.info("Master ready %.3fs after boot (app preloaded).", time.time() - BOOT_STARTED)
+
+
+def post_worker_init(worker):
+    from app import start_reservation_sweeper
+
+    # Several workers may sweep at once; the sweeper locks with SKIP LOCKED.
+    start_reservation_sweeper()
+    worker.log.info("Worker %s ready %.3fs after boot.", worker.pid, time.time() - BOOT_STARTED)
+
+
+def post_request(worker, req, environ, resp):
+    global _first_request_logged
+    if not _first_request_logged:
+        _first_request_logged = True
+        worker.log.info("Worker %s served its first request %.3fs after boot.",
+                        worker.pid, time.time() - BOOT_STARTED)
@@ -1 +1,4 @@
-from app import app
\ No newline at end of file
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import app, warm_up
+
+warm_up()